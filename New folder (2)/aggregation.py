@@ -0,0 +1,505 @@
+from functools import reduce
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from order_data import DAYS_OF_WEEK, TIME_CODE_DTYPES, decode_prefixed_ids, day_labels, month_labels, time_codes
+from segmentation import DEFAULT_SEGMENTS, customer_segments
+from sketches import HashSample, HeavyHitters, HyperLogLog, KLLSketch, dkw_bound, hash_values
+
+# Dimensions shared by the product, city, payment and monthly revenue analyses
+CUBE_DIMENSIONS = ['product_name', 'city', 'payment_method', 'month']
+# Dimensions of the separate, small time-of-sale cube; keeping day_of_week and hour
+# out of the main cube stops it growing towards one cell per order once orders have times.
+# month, day_of_week and hour are integer codes derived from order_date (see TIME_CODE_DTYPES)
+TIME_CUBE_DIMENSIONS = ['month', 'day_of_week', 'hour']
+
+# Columns whose most frequent value is reported for every customer
+PREFERENCE_COLUMNS = ['city', 'payment_method']
+# Columns whose most frequent values are tracked by OrderSketches
+HEAVY_HITTER_COLUMNS = ['product_name', 'city']
+# Columns kept for the orders of the customers sampled by OrderSketches
+SAMPLE_COLUMNS = ['order_id', 'customer_id', 'order_date', 'total_price'] + PREFERENCE_COLUMNS
+
+def _cube_measures(df):
+    """Additive measures kept for every cell of the cube"""
+    measures = {
+        'rows': ('total_price', 'size'),
+        'orders': ('order_id', 'count'),
+        'transactions': ('total_price', 'count'),
+        'revenue': ('total_price', 'sum')
+    }
+    if 'quantity' in df.columns:
+        measures['units'] = ('quantity', 'sum')
+    return measures
+
+def _group_cube(df, dimensions):
+    """Additive measures of every combination of the dimensions present in df"""
+    # Time codes are derived from order_date here rather than stored on the frame
+    keys = [
+        df[col] if col in df.columns else time_codes(df['order_date'], col)
+        for col in dimensions
+        if col in df.columns or (col in TIME_CODE_DTYPES and 'order_date' in df.columns)
+    ]
+    return df.groupby(keys, observed=True, dropna=False).agg(**_cube_measures(df)).reset_index()
+
+def _merge_cubes(cubes, dimensions, measures):
+    cube = pd.concat(cubes, ignore_index=True)
+    return cube.groupby(dimensions, observed=True, dropna=False)[measures].sum().reset_index()
+
+def _customer_measures(df):
+    """Per-customer measures; all are summed when merged except last_order, which takes the latest"""
+    measures = {
+        'purchases': ('total_price', 'size'),
+        'transactions': ('total_price', 'count'),
+        'revenue': ('total_price', 'sum')
+    }
+    if 'order_date' in df.columns:
+        # Recency of RFM segmentation (see segmentation.py)
+        measures['last_order'] = ('order_date', 'max')
+    return measures
+
+def pair_counts(df, key, column):
+    """Rows and earliest order date of every (key, value) pair present in the data.
+
+    Both merge across disjoint sets of rows: counts are summed and
+    first_order takes the earliest (see OrderAggregates.combine).
+    """
+    grouped = df.groupby([key, column], observed=True)
+    if 'order_date' not in df.columns:
+        return grouped.size().to_frame('count')
+    return grouped.agg(count=(column, 'size'), first_order=('order_date', 'min'))
+
+def mode_from_counts(counts):
+    """Most frequent value per key, given the (key, value) pair counts of pair_counts.
+
+    Ties go to the value the key's orders used first, as they do for
+    value_counts over rows in date order, so no value is favoured by its
+    name. Values tied on that as well go to the one that sorts first.
+    """
+    key, column = counts.index.names
+    ranked = counts.reset_index()
+    by = [key, 'count'] + (['first_order'] if 'first_order' in ranked.columns else []) + [column]
+    ascending = [True, False] + [True] * (len(by) - 2)
+    ranked = ranked.sort_values(by, ascending=ascending, kind='stable')
+    return ranked.drop_duplicates(key).set_index(key)[column]
+
+def group_mode(df, key, column):
+    """Vectorized equivalent of groupby(key)[column].agg(lambda x: x.value_counts().index[0])"""
+    return mode_from_counts(pair_counts(df, key, column))
+
+def align_customer_keys(state, state_ids, part, part_ids):
+    """Key the customer tables of two aggregates the same way before merging.
+
+    state_ids and part_ids are the encoded ID formats returned by
+    order_data.compact_columns for the rows behind each side. Customer keys
+    stay integer codes only while both sides are encoded; otherwise the
+    encoded side is turned back into strings. Returns (state, part, ids)
+    where ids describes the keys of the merged result.
+    """
+    state_encoded = 'customer_id' in state_ids
+    if state_encoded == ('customer_id' in part_ids):
+        return state, part, state_ids
+    if state_encoded:
+        state = state.relabel_customers(lambda keys: _decode_keys(keys, state_ids['customer_id']))
+    else:
+        part = part.relabel_customers(lambda keys: _decode_keys(keys, part_ids['customer_id']))
+    ids = {column: fmt for column, fmt in state_ids.items() if column != 'customer_id'}
+    return state, part, ids
+
+def _decode_keys(keys, id_format):
+    prefix, width = id_format
+    return pd.Index(decode_prefixed_ids(pd.Series(keys), prefix, width), name=keys.name)
+
+class OrderAggregates:
+    """Group statistics shared by all EcommerceAnalyzer.analyze_* methods.
+
+    The order rows are scanned once into a cube keyed on every shared
+    dimension, once into a time-of-sale cube (TIME_CUBE_DIMENSIONS) and once
+    per customer. Each analysis is then a rollup of these small tables
+    rather than a new groupby over the full data.
+    """
+
+    def __init__(self, cube, customers, preferences=None, sketches=None, time_cube=None):
+        self.cube = cube
+        self.time_cube = time_cube
+        self.customers = customers
+        self.preferences = preferences or {}
+        # OrderSketches answering customer questions when per-customer tables are not kept
+        self.sketches = sketches
+        # Customer segmentations by number of segments, computed on first use
+        self._segments = {}
+        self.dimensions = [col for col in CUBE_DIMENSIONS if col in cube.columns]
+        self.measures = [col for col in cube.columns if col not in self.dimensions]
+
+    def __getstate__(self):
+        # Memoized segmentations are not persisted or sent to worker processes
+        return {**self.__dict__, '_segments': {}}
+
+    @classmethod
+    def from_frame(cls, df, sketches=False, customers=True):
+        """Build the aggregates with one pass for the cube and one for customers.
+
+        With sketches=True, OrderSketches of the rows are built as well. With
+        customers=False the per-customer tables are never built, so customer
+        questions are answered from the sketches alone.
+        """
+        cube = _group_cube(df, CUBE_DIMENSIONS)
+        time_cube = _group_cube(df, TIME_CUBE_DIMENSIONS) if 'order_date' in df.columns else None
+
+        # Orders read without customer_id (see storage.columns_for) have no customer tables
+        customer_table, preferences = None, None
+        if customers and 'customer_id' in df.columns:
+            customer_table = df.groupby('customer_id', observed=True).agg(**_customer_measures(df))
+            preferences = {
+                column: pair_counts(df, 'customer_id', column)
+                for column in PREFERENCE_COLUMNS if column in df.columns
+            }
+        return cls(cube, customer_table, preferences, OrderSketches.from_frame(df) if sketches else None,
+                   time_cube)
+
+    @classmethod
+    def combine(cls, parts):
+        """Merge the aggregates of disjoint sets of rows in a single pass"""
+        parts = list(parts)
+        first = parts[0]
+        cube = _merge_cubes([part.cube for part in parts], first.dimensions, first.measures)
+        time_cube = None
+        if all(part.time_cube is not None for part in parts):
+            time_cube = _merge_cubes([part.time_cube for part in parts], TIME_CUBE_DIMENSIONS, first.measures)
+
+        customers = None
+        if all(part.customers is not None for part in parts):
+            customers = pd.concat([part.customers for part in parts])
+            customers = customers.groupby(level=0, observed=True).agg(
+                {column: 'max' if column == 'last_order' else 'sum' for column in customers.columns}
+            )
+        preferences = {}
+        for column in first.preferences:
+            if not all(column in part.preferences for part in parts):
+                continue
+            counts = pd.concat([part.preferences[column] for part in parts])
+            preferences[column] = counts.groupby(level=[0, 1], observed=True).agg(
+                {measure: 'min' if measure == 'first_order' else 'sum' for measure in counts.columns}
+            )
+
+        sketches = None
+        if all(part.sketches is not None for part in parts):
+            sketches = reduce(lambda a, b: a.merge(b), [part.sketches for part in parts])
+        return cls(cube, customers, preferences, sketches, time_cube)
+
+    def merge(self, other):
+        """Combine with the aggregates of a disjoint set of rows"""
+        return OrderAggregates.combine([self, other])
+
+    def drop_customers(self):
+        """Forget the per-customer tables, keeping only the sketches"""
+        return OrderAggregates(self.cube, None, None, self.sketches, self.time_cube)
+
+    def relabel_customers(self, mapper):
+        """Return a copy whose customer keys are passed through mapper(Index) -> Index"""
+        customers = None
+        if self.customers is not None:
+            customers = self.customers.set_axis(mapper(self.customers.index))
+        preferences = {}
+        for column, counts in self.preferences.items():
+            keys = mapper(counts.index.get_level_values(0))
+            index = pd.MultiIndex.from_arrays([keys, counts.index.get_level_values(1)], names=counts.index.names)
+            preferences[column] = counts.set_axis(index)
+        return OrderAggregates(self.cube, customers, preferences, self.sketches, self.time_cube)
+
+    @property
+    def has_customers(self):
+        """Whether customer questions can be answered, exactly or from the sketches"""
+        return self.customers is not None or self.sketches is not None
+
+    def rollup(self, dimension):
+        """Sum every measure over one dimension or a list of them, from the cube that holds them"""
+        dimensions = {dimension} if isinstance(dimension, str) else set(dimension)
+        cube = self.cube if dimensions <= set(self.dimensions) else self.time_cube
+        if cube is None:
+            raise ValueError(f"No cube of these aggregates is keyed on {', '.join(sorted(dimensions))}")
+        return cube.groupby(dimension, observed=True)[self.measures].sum()
+
+    def where(self, **selections):
+        """Aggregates of the cube cells whose dimensions take the selected values.
+
+        Per-customer tables cannot be sliced by the cube dimensions, so they
+        are dropped; only cube rollups can be answered from the result. The
+        time-of-sale cube is kept only when every selected column is one of
+        its dimensions.
+        """
+        def select(cube):
+            mask = np.ones(len(cube), dtype=bool)
+            for column, values in selections.items():
+                mask &= cube[column].isin(values).to_numpy()
+            return cube[mask]
+
+        time_cube = None
+        if self.time_cube is not None and set(selections) <= set(TIME_CUBE_DIMENSIONS):
+            time_cube = select(self.time_cube)
+        return OrderAggregates(select(self.cube), None, time_cube=time_cube)
+
+    def top_products(self):
+        """Product revenue table as returned by analyze_top_products"""
+        products = self.rollup('product_name')
+        product_revenue = pd.DataFrame({
+            'Total Revenue (₹)': products['revenue'],
+            'Units Sold': products['units'],
+            'Number of Orders': products['orders']
+        }).round(2)
+        return product_revenue.sort_values('Total Revenue (₹)', ascending=False)
+
+    def monthly_revenue(self):
+        """Revenue per month as returned by analyze_revenue_trends"""
+        revenue = self.rollup('month')['revenue'].rename('total_price')
+        return revenue.set_axis(month_labels(revenue.index))
+
+    def revenue_trends(self):
+        """Monthly revenue and growth as returned by analyze_revenue_trends"""
+        monthly_revenue = self.monthly_revenue()
+
+        # Calculate month-over-month growth (pct_change fails on an empty series)
+        monthly_growth = monthly_revenue.pct_change() * 100 if len(monthly_revenue) else monthly_revenue
+
+        return {
+            'revenue': monthly_revenue,
+            'growth': monthly_growth
+        }
+
+    def regional_performance(self):
+        """City table as returned by analyze_regional_performance"""
+        cities = self.rollup('city')
+        city_metrics = pd.DataFrame({
+            'Total Revenue (₹)': cities['revenue'],
+            'Avg Order Value (₹)': cities['revenue'] / cities['transactions'],
+            'Number of Transactions': cities['transactions'],
+            'Number of Orders': cities['orders']
+        }).round(2)
+        return city_metrics.sort_values('Total Revenue (₹)', ascending=False)
+
+    def payment_methods(self):
+        """Payment table as returned by analyze_payment_methods"""
+        payments = self.rollup('payment_method')
+        payment_analysis = pd.DataFrame({
+            'Number of Orders': payments['orders'],
+            'Total Revenue (₹)': payments['revenue'],
+            'Avg Order Value (₹)': payments['revenue'] / payments['transactions']
+        }).round(2)
+        return payment_analysis.sort_values('Number of Orders', ascending=False)
+
+    def peak_periods(self):
+        """Revenue and orders by day of the week and by hour of the day"""
+        def sales(dimension):
+            totals = self.rollup(dimension)
+            return pd.DataFrame({
+                'Total Revenue (₹)': totals['revenue'],
+                'Number of Orders': totals['orders']
+            }).round(2)
+
+        by_day = sales('day_of_week').reindex(range(len(DAYS_OF_WEEK)), fill_value=0)
+        by_day = by_day.set_axis(day_labels(by_day.index))
+        return {
+            'day_of_week': by_day,
+            'hour': sales('hour')
+        }
+
+    def customer_metrics(self):
+        """Per-customer purchase frequency, average order value and lifetime value"""
+        return pd.DataFrame({
+            'purchase_frequency': self.customers['purchases'],
+            'avg_order_value': self.customers['revenue'] / self.customers['transactions'],
+            'customer_lifetime': self.customers['revenue']
+        })
+
+    def preferred(self, column):
+        """Each customer's most frequent value of a preference column"""
+        return mode_from_counts(self.preferences[column])
+
+    def customer_segments(self, n_segments=DEFAULT_SEGMENTS):
+        """RFM segmentation as returned by analyze_customer_segments (see segmentation.py)"""
+        if n_segments not in self._segments:
+            self._segments[n_segments] = customer_segments(self.customers, n_segments)
+        return self._segments[n_segments]
+
+    def customer_behavior(self):
+        """Customer summaries as returned by analyze_customer_behavior"""
+        if self.customers is None:
+            return self.sketches.customer_behavior()
+
+        # Purchase frequency, average order value and lifetime value per customer
+        customer_metrics = self.customer_metrics()
+
+        # Customer city preference
+        customer_cities = self.preferred('city')
+
+        # Preferred payment methods
+        customer_payments = self.preferred('payment_method')
+
+        return {
+            'purchase_frequency': customer_metrics['purchase_frequency'].describe(),
+            'avg_order_value': customer_metrics['avg_order_value'].describe(),
+            'customer_lifetime': customer_metrics['customer_lifetime'].describe(),
+            'city_distribution': customer_cities.value_counts()[lambda x: x > 0],
+            'payment_preferences': customer_payments.value_counts()[lambda x: x > 0]
+        }
+
+    def overview(self):
+        """Headline totals used by the report, dashboard and Excel overview"""
+        transactions = self.cube['transactions'].sum()
+        total_revenue = self.cube['revenue'].sum()
+        overview = {
+            'total_orders': int(self.cube['rows'].sum()),
+            'total_revenue': total_revenue,
+            'average_order_value': total_revenue / transactions if transactions else float('nan'),
+        }
+        if self.customers is not None:
+            overview['total_customers'] = len(self.customers)
+            overview['repeat_customers'] = int((self.customers['purchases'] > 1).sum())
+        elif self.sketches is not None:
+            overview['total_customers'] = self.sketches.distinct_customers()
+            overview['repeat_customers'] = self.sketches.repeat_customers()
+        else:
+            overview['total_customers'] = None
+            overview['repeat_customers'] = None
+        return overview
+
+class OrderSketches:
+    """Mergeable summaries of the orders whose size does not grow with the data.
+
+    - a HyperLogLog of distinct customers
+    - a coordinated hash sample of customers holding all of their orders,
+      from which repeat customers and per-customer distributions (purchase
+      frequency, order value, lifetime value, preferences) are estimated
+    - a KLL sketch of order values for percentiles
+    - Count-Min heavy hitters of the most ordered products and cities
+
+    Sketches built over any partitioning of the orders (chunks, dates or
+    customer hashes) merge into the sketches of the whole data.
+    """
+
+    def __init__(self, precision=14, k=200, sample_rows=100_000, heavy_hitters=20):
+        self.customers = HyperLogLog(precision)
+        self.customer_sample = HashSample(sample_rows, SAMPLE_COLUMNS)
+        self.order_values = KLLSketch(k)
+        self.heavy_hitters = {column: HeavyHitters(heavy_hitters) for column in HEAVY_HITTER_COLUMNS}
+
+    @classmethod
+    def from_frame(cls, df, **options):
+        """Sketch a DataFrame of orders"""
+        sketches = cls(**options)
+        sketches.update(df)
+        return sketches
+
+    def update(self, df):
+        """Add a batch of order rows"""
+        self.order_values.update(df['total_price'])
+        for column, hitters in self.heavy_hitters.items():
+            if column in df.columns:
+                hitters.update(df[column])
+
+        known = df['customer_id'].notna()
+        if not known.all():
+            df = df[known]
+        hashes = hash_values(df['customer_id'])
+        self.customers.update_hashes(hashes)
+        self.customer_sample.update(df, hashes)
+
+    def merge(self, other):
+        """Combine with the sketches of other order rows"""
+        merged = OrderSketches.__new__(OrderSketches)
+        merged.customers = self.customers.merge(other.customers)
+        merged.customer_sample = self.customer_sample.merge(other.customer_sample)
+        merged.order_values = self.order_values.merge(other.order_values)
+        merged.heavy_hitters = {
+            column: hitters.merge(other.heavy_hitters[column])
+            for column, hitters in self.heavy_hitters.items()
+        }
+        return merged
+
+    @property
+    def exact_customers(self):
+        """True while the sample still holds every customer, so customer figures are exact"""
+        return self.customer_sample.level == 0
+
+    def sample_aggregates(self):
+        """Exact aggregates of the sampled customers' orders"""
+        rows = self.customer_sample.rows
+        if rows is None:
+            rows = pd.DataFrame(columns=SAMPLE_COLUMNS)
+        return OrderAggregates.from_frame(rows)
+
+    def distinct_customers(self):
+        """Number of distinct customers"""
+        if self.exact_customers:
+            rows = self.customer_sample.rows
+            return 0 if rows is None else int(rows['customer_id'].nunique())
+        return int(round(self.customers.estimate()))
+
+    def repeat_customers(self):
+        """Number of customers with more than one order"""
+        customers = self.sample_aggregates().customers
+        repeat = int((customers['purchases'] > 1).sum())
+        if self.exact_customers or len(customers) == 0:
+            return repeat
+        # The repeat share of the sample scales the (lower variance) distinct count
+        return int(round(self.distinct_customers() * repeat / len(customers)))
+
+    def customer_behavior(self):
+        """analyze_customer_behavior estimated from the sampled customers.
+
+        Percentiles and means are those of the sample; counts are scaled up
+        to the estimated number of distinct customers.
+        """
+        sample = self.sample_aggregates()
+        behavior = sample.customer_behavior()
+        scale = self.distinct_customers() / len(sample.customers) if len(sample.customers) else 0
+        for key in ('purchase_frequency', 'avg_order_value', 'customer_lifetime'):
+            behavior[key]['count'] = round(behavior[key]['count'] * scale)
+        for key in ('city_distribution', 'payment_preferences'):
+            behavior[key] = (behavior[key] * scale).round().astype(np.int64)
+        return behavior
+
+    def top(self, column):
+        """Estimated order counts of the most frequent values of a heavy-hitter column"""
+        return self.heavy_hitters[column].top().round().astype(np.int64).rename('Number of Orders')
+
+    def error_bounds(self, confidence=0.95):
+        """Error of every approximate figure.
+
+        Customer counts get a relative error at `confidence`, percentiles a
+        normalized rank error and heavy-hitter counts an absolute overcount
+        (probability 1 - exp(-depth)). The order value rank error is the
+        KLL bound at 99% confidence.
+        """
+        sampled = len(self.sample_aggregates().customers)
+        if self.exact_customers:
+            customers_error = repeat_error = quantile_error = 0.0
+        else:
+            z = NormalDist().inv_cdf((1 + confidence) / 2)
+            customers_error = z * self.customers.relative_error
+            share = self.repeat_customers() / max(self.distinct_customers(), 1)
+            share_error = z * np.sqrt(share * (1 - share) / sampled) / share if share and sampled else float('nan')
+            repeat_error = float(np.hypot(customers_error, share_error))
+            quantile_error = dkw_bound(sampled, confidence)
+        bounds = {
+            'total_customers_relative': float(customers_error),
+            'repeat_customers_relative': repeat_error,
+            'customer_quantiles_rank': quantile_error,
+            'order_value_quantiles_rank': self.order_values.rank_error,
+            'sampled_customers': sampled,
+            'sample_fraction': self.customer_sample.fraction
+        }
+        for column, hitters in self.heavy_hitters.items():
+            bounds[f'{column}_count_overcount'] = float(hitters.error_bound)
+        return bounds
+
+    def summary(self):
+        """Approximate figures with their error bounds, as included in the report"""
+        return {
+            'order_value': self.order_values.describe(),
+            'top_products': self.top('product_name'),
+            'top_cities': self.top('city'),
+            'error_bounds': self.error_bounds()
+        }
\ No newline at end of file
@@ -3,9 +3,14 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from ecommerce_analysis import EcommerceAnalyzer
+from query import OrderQuery
+from chart_data import top_n, downsample
+from timeseries import GRANULARITIES
+import instrumentation
 import os
-import base64
+from concurrent.futures import as_completed
 from datetime import datetime
+from export import EXPORT_FORMATS, iter_chunks, export_to_tempfile
 
 # Set page config
 st.set_page_config(
@@ -17,182 +22,370 @@ st.set_page_config(
 # Title
 st.title("📊 E-commerce Sales Analysis Dashboard")
 
-# Initialize the analyzer
-@st.cache_data
+# Stage timings for the debug panel; registered once per server process
+@st.cache_resource
+def stage_registry():
+    return instrumentation.add_sink(instrumentation.MemorySink())
+
+stage_registry()
+
+# Initialize the analyzer. The cleaned orders are memory-mapped from the shared
+# store, so every server and worker process maps the same copy of the data
 def load_data():
-    analyzer = EcommerceAnalyzer('data/ecommerce_data.csv')
+    # Filters and exports need the order rows, so incremental aggregation is not used here
+    analyzer = EcommerceAnalyzer('data/ecommerce_data.csv', shared=True)
     analyzer.clean_data()
+    # Compute the shared aggregates up front so reruns reuse them
+    analyzer.compute_aggregates()
     return analyzer
 
-analyzer = load_data()
+# One memoized query layer per server process; reruns and sessions share its results.
+# The unfiltered sections start computing as soon as the data is loaded or refreshed
+@st.cache_resource
+def load_query():
+    query = OrderQuery(load_data())
+    query.prewarm()
+    return query
+
+query = load_query()
+query.refresh(prewarm=True)
+analyzer = query.analyzer
+
+# Sidebar filters; every section below is computed for the selected orders
+st.sidebar.header("🔎 Filters")
+first_date, last_date = query.index.date_range
+date_range = st.sidebar.date_input(
+    "Order Date Range",
+    value=(first_date.date(), last_date.date()),
+    min_value=first_date.date(),
+    max_value=last_date.date()
+)
+filters = {
+    'cities': st.sidebar.multiselect("City", query.options('city')),
+    'categories': st.sidebar.multiselect("Product Category", query.options('product_name'))
+}
+# The date picker returns a single date while a range is being chosen
+if len(date_range) == 2:
+    filters['start'], filters['end'] = date_range
+
+def render_overview(overview):
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Orders", f"{overview['total_orders']:,}")
+    with col2:
+        st.metric("Total Revenue", f"₹{overview['total_revenue']:,.2f}")
+    with col3:
+        st.metric("Average Order Value", f"₹{overview['average_order_value']:,.2f}")
+    with col4:
+        st.metric("Total Customers", f"{overview['total_customers']:,}")
+
+def render_trends(revenue_series):
+    if not len(revenue_series):
+        st.info("No dated orders match the selected filters.")
+        return
+
+    # Every view is read from the series' prefix sums, so changing these never rescans the orders
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        granularity = st.selectbox("Granularity", list(GRANULARITIES), index=list(GRANULARITIES).index('Monthly'))
+    with col2:
+        window = st.slider("Rolling average window (periods)", min_value=1, max_value=12, value=3)
+    with col3:
+        compare = st.radio("Growth compared with", ['Previous period', 'Same period last year'])
+    freq = GRANULARITIES[granularity]
+
+    # Long daily series are reduced to the points that keep their shape
+    revenue = downsample(revenue_series.resample(freq))
+    rolling = downsample(revenue_series.rolling(freq, window, mean=True))
+    growth = revenue_series.growth(freq, 'previous' if compare == 'Previous period' else 'year')
+    growth = downsample(growth.replace([float('inf'), float('-inf')], float('nan')).dropna())
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=revenue.index.to_timestamp(), y=revenue.values,
+                                 mode='lines', name='Revenue'))
+        fig.add_trace(go.Scatter(x=rolling.index.to_timestamp(), y=rolling.values,
+                                 mode='lines', name=f'{window}-period average'))
+        fig.update_layout(title=f'{granularity} Revenue', xaxis_title='Date', yaxis_title='Revenue (₹)')
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        fig = go.Figure(go.Bar(x=growth.index.to_timestamp(), y=growth.values, name='Growth'))
+        fig.update_layout(title=f'{granularity} Revenue Growth', xaxis_title='Date', yaxis_title='Growth (%)')
+        st.plotly_chart(fig, use_container_width=True)
+        if not len(growth):
+            st.caption("Not enough history to compare against yet.")
+
+def render_products(product_analysis):
+    # Create two columns for product visualizations
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig = px.bar(
+            product_analysis.head(),
+            x=product_analysis.head().index,
+            y='Total Revenue (₹)',
+            title='Top Product Categories by Revenue',
+            labels={'x': 'Product Category', 'y': 'Revenue (₹)'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        # Small categories are folded into "Other" so the pie stays readable and light
+        product_units = top_n(product_analysis, 'Units Sold')
+        fig = px.pie(
+            product_units,
+            values='Units Sold',
+            names=product_units.index,
+            title='Product Distribution by Units Sold'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_regions(regional_analysis):
+    # Create two columns for regional visualizations
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig = px.bar(
+            regional_analysis.head(),
+            x=regional_analysis.head().index,
+            y='Total Revenue (₹)',
+            title='Top Cities by Revenue',
+            labels={'x': 'City', 'y': 'Revenue (₹)'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        # One bubble per top city, the remaining cities merged into one bubble
+        city_bubbles = top_n(
+            regional_analysis, 'Total Revenue (₹)',
+            ratios={'Avg Order Value (₹)': ('Total Revenue (₹)', 'Number of Transactions')}
+        )
+        fig = px.scatter(
+            city_bubbles,
+            x='Number of Orders',
+            y='Avg Order Value (₹)',
+            size='Total Revenue (₹)',
+            color=city_bubbles.index,
+            title='City Performance Analysis',
+            labels={'x': 'Number of Orders', 'y': 'Average Order Value (₹)'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_payments(payment_analysis):
+    # The table's averages are per priced transaction, so "Other" recovers its transactions from them
+    payment_chart = top_n(
+        payment_analysis, 'Number of Orders',
+        ratios={'Avg Order Value (₹)': ('Total Revenue (₹)', None)}
+    )
+
+    # Create two columns for payment visualizations
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig = px.bar(
+            payment_chart,
+            x=payment_chart.index,
+            y='Number of Orders',
+            title='Payment Method Distribution',
+            labels={'x': 'Payment Method', 'y': 'Number of Orders'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        fig = px.pie(
+            payment_chart,
+            values='Total Revenue (₹)',
+            names=payment_chart.index,
+            title='Revenue Distribution by Payment Method'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_peak_periods(peak_periods):
+    # Create two columns for time-of-sale visualizations
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig = px.bar(
+            peak_periods['day_of_week'],
+            x=peak_periods['day_of_week'].index,
+            y='Total Revenue (₹)',
+            title='Revenue by Day of Week',
+            labels={'x': 'Day of Week', 'y': 'Revenue (₹)'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        fig = px.bar(
+            peak_periods['hour'],
+            x=peak_periods['hour'].index,
+            y='Number of Orders',
+            title='Orders by Hour of Day',
+            labels={'x': 'Hour', 'y': 'Number of Orders'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_customers(customer_behavior):
+    # Create two columns for customer behavior visualizations
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Purchase Frequency Statistics")
+        st.dataframe(customer_behavior['purchase_frequency'].describe())
+
+    with col2:
+        st.subheader("Top Cities by Customer Count")
+        city_distribution = customer_behavior['city_distribution'].head()
+        fig = px.bar(
+            x=city_distribution.index,
+            y=city_distribution.values,
+            title='Top Cities by Customer Count',
+            labels={'x': 'City', 'y': 'Number of Customers'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
 
-# Download functionality
-def get_download_link(df, filename, text):
-    """Generates a link to download the dataframe as a CSV file"""
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">{text}</a>'
-    return href
+def render_segments(customer_segments):
+    if customer_segments is None:
+        st.info("Customer segments need per-customer data, which is not available for this dataset.")
+        return
+    summary = customer_segments['summary']
+
+    # Create two columns for segment visualizations
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig = px.bar(
+            summary,
+            x=summary.index,
+            y='Customers',
+            title='Customers by RFM Segment',
+            labels={'x': 'Segment', 'y': 'Number of Customers'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        fig = px.pie(
+            summary,
+            values='Total Revenue (₹)',
+            names=summary.index,
+            title='Revenue by RFM Segment'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(summary)
+
+# Dashboard sections in page order: (metric, header, renderer)
+SECTIONS = [
+    ('revenue_series', "💹 Revenue Trends", render_trends),
+    ('top_products', "📦 Product Analysis", render_products),
+    ('regional_performance', "🌍 Regional Analysis", render_regions),
+    ('payment_methods', "💳 Payment Method Analysis", render_payments),
+    ('peak_periods', "📅 Peak Sales Periods", render_peak_periods),
+    ('customer_behavior', "👥 Customer Behavior", render_customers),
+    ('customer_segments', "🎯 Customer Segments", render_segments)
+]
+
+# Every section starts computing at once in the query layer's thread pool
+futures = {metric: query.submit(metric, **filters) for metric in ['overview'] + [s[0] for s in SECTIONS]}
+
+# Overview Section; it is the cheapest and decides whether anything matched
+st.header("📈 Overview")
+overview = futures['overview'].result()
+if overview['total_orders'] == 0:
+    st.warning("No orders match the selected filters.")
+    st.stop()
+render_overview(overview)
+
+# The other sections are laid out now and filled in as their results arrive
+placeholders = {}
+for metric, header, _ in SECTIONS:
+    st.header(header)
+    placeholders[metric] = st.empty()
+    placeholders[metric].caption("⏳ Computing...")
+
+renderers = {metric: render for metric, _, render in SECTIONS}
+pending = {futures[metric]: metric for metric, _, _ in SECTIONS}
+for future in as_completed(pending):
+    metric = pending[future]
+    with placeholders[metric].container():
+        renderers[metric](future.result())
 
 # Sidebar for downloads
 st.sidebar.header("📥 Export Data")
 st.sidebar.subheader("Download Analysis Reports")
+timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-# Create download buttons for different reports
-if st.sidebar.button("📊 Download Full Analysis Report"):
-    report = analyzer.generate_report()
-    report_df = pd.DataFrame(report)
-    st.sidebar.markdown(get_download_link(
-        report_df,
-        f"ecommerce_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        "⬇️ Download Full Report"
-    ), unsafe_allow_html=True)
-
-if st.sidebar.button("📦 Download Product Analysis"):
-    product_analysis = analyzer.analyze_top_products()
-    st.sidebar.markdown(get_download_link(
-        product_analysis,
-        f"product_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        "⬇️ Download Product Analysis"
-    ), unsafe_allow_html=True)
-
-if st.sidebar.button("🌍 Download Regional Analysis"):
-    regional_analysis = analyzer.analyze_regional_performance()
-    st.sidebar.markdown(get_download_link(
-        regional_analysis,
-        f"regional_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        "⬇️ Download Regional Analysis"
-    ), unsafe_allow_html=True)
-
-if st.sidebar.button("💳 Download Payment Analysis"):
-    payment_analysis = analyzer.analyze_payment_methods()
-    st.sidebar.markdown(get_download_link(
-        payment_analysis,
-        f"payment_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        "⬇️ Download Payment Analysis"
-    ), unsafe_allow_html=True)
-
-# Overview Section
-st.header("📈 Overview")
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric("Total Orders", f"{analyzer.df.shape[0]:,}")
-with col2:
-    st.metric("Total Revenue", f"₹{analyzer.df['total_price'].sum():,.2f}")
-with col3:
-    st.metric("Average Order Value", f"₹{analyzer.df['total_price'].mean():,.2f}")
-with col4:
-    st.metric("Total Customers", f"{analyzer.df['customer_id'].nunique():,}")
-
-# Product Analysis
-st.header("📦 Product Analysis")
-product_analysis = analyzer.analyze_top_products()
-
-# Create two columns for product visualizations
-col1, col2 = st.columns(2)
-
-with col1:
-    fig = px.bar(
-        product_analysis.head(),
-        x=product_analysis.head().index,
-        y='Total Revenue (₹)',
-        title='Top Product Categories by Revenue',
-        labels={'x': 'Product Category', 'y': 'Revenue (₹)'}
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-with col2:
-    fig = px.pie(
-        product_analysis,
-        values='Units Sold',
-        names=product_analysis.index,
-        title='Product Distribution by Units Sold'
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-# Regional Analysis
-st.header("🌍 Regional Analysis")
-regional_analysis = analyzer.analyze_regional_performance()
-
-# Create two columns for regional visualizations
-col1, col2 = st.columns(2)
-
-with col1:
-    fig = px.bar(
-        regional_analysis.head(),
-        x=regional_analysis.head().index,
-        y='Total Revenue (₹)',
-        title='Top Cities by Revenue',
-        labels={'x': 'City', 'y': 'Revenue (₹)'}
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-with col2:
-    fig = px.scatter(
-        regional_analysis,
-        x='Number of Orders',
-        y='Avg Order Value (₹)',
-        size='Total Revenue (₹)',
-        color=regional_analysis.index,
-        title='City Performance Analysis',
-        labels={'x': 'Number of Orders', 'y': 'Average Order Value (₹)'}
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-# Payment Analysis
-st.header("💳 Payment Method Analysis")
-payment_analysis = analyzer.analyze_payment_methods()
-
-# Create two columns for payment visualizations
-col1, col2 = st.columns(2)
-
-with col1:
-    fig = px.bar(
-        payment_analysis,
-        x=payment_analysis.index,
-        y='Number of Orders',
-        title='Payment Method Distribution',
-        labels={'x': 'Payment Method', 'y': 'Number of Orders'}
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-with col2:
-    fig = px.pie(
-        payment_analysis,
-        values='Total Revenue (₹)',
-        names=payment_analysis.index,
-        title='Revenue Distribution by Payment Method'
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-# Customer Behavior
-st.header("👥 Customer Behavior")
-customer_behavior = analyzer.analyze_customer_behavior()
-
-# Create two columns for customer behavior visualizations
-col1, col2 = st.columns(2)
-
-with col1:
-    st.subheader("Purchase Frequency Statistics")
-    st.dataframe(customer_behavior['purchase_frequency'].describe())
-
-with col2:
-    st.subheader("Top Cities by Customer Count")
-    city_distribution = customer_behavior['city_distribution'].head()
-    fig = px.bar(
-        x=city_distribution.index,
-        y=city_distribution.values,
-        title='Top Cities by Customer Count',
-        labels={'x': 'City', 'y': 'Number of Customers'}
-    )
-    st.plotly_chart(fig, use_container_width=True)
+# The analysis tables are small rollups, so they are served directly
+@st.cache_data
+def report_csv(data_version):
+    return pd.DataFrame(analyzer.generate_report()).to_csv(index=False)
+
+st.sidebar.download_button(
+    "📊 Download Full Analysis Report",
+    report_csv(query.version),
+    file_name=f"ecommerce_analysis_{timestamp}.csv",
+    mime='text/csv'
+)
+st.sidebar.download_button(
+    "📦 Download Product Analysis",
+    futures['top_products'].result().to_csv(),
+    file_name=f"product_analysis_{timestamp}.csv",
+    mime='text/csv'
+)
+st.sidebar.download_button(
+    "🌍 Download Regional Analysis",
+    futures['regional_performance'].result().to_csv(),
+    file_name=f"regional_analysis_{timestamp}.csv",
+    mime='text/csv'
+)
+st.sidebar.download_button(
+    "💳 Download Payment Analysis",
+    futures['payment_methods'].result().to_csv(),
+    file_name=f"payment_analysis_{timestamp}.csv",
+    mime='text/csv'
+)
 
 # Add a section for raw data download
 st.sidebar.header("📊 Raw Data")
-if st.sidebar.button("📥 Download Raw Dataset"):
-    st.sidebar.markdown(get_download_link(
+export_columns = st.sidebar.multiselect(
+    "Columns", list(analyzer.df.columns), default=list(analyzer.df.columns)
+)
+export_format = st.sidebar.selectbox("Format", list(EXPORT_FORMATS))
+export_filtered = st.sidebar.checkbox("Only orders matching the filters", value=True)
+
+# The export is written chunk by chunk to a temporary file, which is removed as soon as
+# it is read back, so no file outlives the run even if the session ends
+if st.sidebar.button("📥 Prepare Raw Dataset", disabled=not export_columns):
+    chunks = iter_chunks(
         analyzer.df,
-        f"raw_ecommerce_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        "⬇️ Download Raw Dataset"
-    ), unsafe_allow_html=True) 
\ No newline at end of file
+        mask=query.mask(**filters) if export_filtered else None,
+        columns=export_columns,
+        transform=analyzer.decode_ids
+    )
+    path = export_to_tempfile(chunks, export_format)
+    try:
+        with open(path, 'rb') as f:
+            st.session_state['raw_export'] = {'data': f.read(), 'format': export_format}
+    finally:
+        os.remove(path)
+
+raw_export = st.session_state.get('raw_export')
+if raw_export:
+    extension, mime = EXPORT_FORMATS[raw_export['format']]
+    st.sidebar.download_button(
+        "⬇️ Download Raw Dataset",
+        raw_export['data'],
+        file_name=f"raw_ecommerce_data_{timestamp}{extension}",
+        mime=mime
+    )
+
+# Per-stage timings recorded by the analyzer
+with st.expander("🛠️ Debug: Stage Timings"):
+    stage_records = stage_registry().to_frame()
+    if stage_records.empty:
+        st.write("No stages recorded yet.")
+    else:
+        st.dataframe(stage_records.drop(columns='timestamp'), use_container_width=True)
+    st.write("Query cache:", query.cache_info())
\ No newline at end of file
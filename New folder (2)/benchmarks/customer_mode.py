@@ -0,0 +1,71 @@
+"""Compare the per-customer mode used by analyze_customer_behavior before and
+after vectorization.
+
+Run from the project directory:
+    python -m benchmarks.customer_mode --rows 200000 --customers 50000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregation import group_mode
+
+CITIES = [
+    'Mumbai', 'Delhi', 'Bangalore', 'Hyderabad', 'Chennai',
+    'Kolkata', 'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow'
+]
+
+def make_orders(rows, customers, seed=0):
+    """Random orders in date order with categorical cities spread over the given customers"""
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, 365 * 24 * 3600, rows))
+    return pd.DataFrame({
+        'customer_id': rng.integers(1, customers + 1, rows).astype(np.int32),
+        'city': pd.Categorical.from_codes(rng.integers(0, len(CITIES), rows), sorted(CITIES)),
+        'order_date': pd.Timestamp('2024-01-01') + pd.to_timedelta(seconds, unit='s')
+    })
+
+def lambda_mode(df):
+    """The original Python-level mode, one value_counts call per customer over the cities as text"""
+    cities = df['city'].astype(object)
+    return cities.groupby(df['customer_id']).agg(lambda x: x.value_counts().index[0])
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--customers', type=int, default=50_000)
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help="largest allowed difference in the share of customers per city")
+    args = parser.parse_args()
+
+    df = make_orders(args.rows, args.customers)
+    legacy, legacy_time = timed(lambda_mode, df)
+    vectorized, vectorized_time = timed(group_mode, df, 'customer_id', 'city')
+
+    # Every customer's mode must be one of its most frequent cities
+    counts = df.groupby(['customer_id', 'city'], observed=True).size()
+    legacy_counts = counts.loc[list(zip(legacy.index, legacy))].to_numpy()
+    vectorized_counts = counts.loc[list(zip(vectorized.index, vectorized))].to_numpy()
+    assert (legacy_counts == vectorized_counts).all(), "modes disagree"
+
+    # Ties must not be broken in favour of some cities, so the modes spread over the cities alike
+    legacy_share = legacy.value_counts(normalize=True)
+    vectorized_share = vectorized.astype(object).value_counts(normalize=True)
+    gap = legacy_share.sub(vectorized_share, fill_value=0).abs().max()
+    assert gap < args.tolerance, f"mode distributions differ by up to {gap:.1%} of customers"
+
+    print(f"{args.rows:,} orders, {len(vectorized):,} customers")
+    print(f"  largest share gap:   {gap:8.2%}")
+    print(f"  lambda value_counts: {legacy_time:8.3f} s")
+    print(f"  vectorized mode:     {vectorized_time:8.3f} s")
+    print(f"  speedup:             {legacy_time / vectorized_time:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Compare pandas' openpyxl ExcelWriter with the streaming write-only workbook
+used by create_excel_report.
+
+Run from the project directory:
+    python -m benchmarks.excel_report --customers 50000
+
+Each writer saves the same per-customer detail table plus the small summary
+sheets. Time is measured on a plain run and peak Python memory on a second
+run under tracemalloc.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from excel_writer import StreamingWorkbook, BATCH_ROWS
+
+CITIES = [
+    'Mumbai', 'Delhi', 'Bangalore', 'Hyderabad', 'Chennai',
+    'Kolkata', 'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow'
+]
+PAYMENT_METHODS = ['UPI', 'Credit Card', 'Debit Card', 'COD', 'Net Banking']
+
+def make_customer_details(customers, seed=0):
+    """A table shaped like the report's Customer Details sheet"""
+    rng = np.random.default_rng(seed)
+    orders = rng.integers(1, 10, customers)
+    revenue = np.round(rng.uniform(100, 80000, customers) * orders, 2)
+    return pd.DataFrame({
+        'customer_id': pd.Series(np.arange(1, customers + 1)).astype(str).str.zfill(6).radd('CUST'),
+        'Number of Orders': orders,
+        'Total Revenue (₹)': revenue,
+        'Avg Order Value (₹)': np.round(revenue / orders, 2),
+        'Preferred City': pd.Categorical.from_codes(rng.integers(0, len(CITIES), customers), CITIES),
+        'Preferred Payment Method': pd.Categorical.from_codes(
+            rng.integers(0, len(PAYMENT_METHODS), customers), PAYMENT_METHODS)
+    })
+
+def summary_sheets(details):
+    return {
+        'Regional Analysis': details.groupby('Preferred City', observed=True)['Total Revenue (₹)'].sum().to_frame(),
+        'Payment Analysis': details.groupby('Preferred Payment Method', observed=True)['Total Revenue (₹)'].sum().to_frame(),
+        'Customer Behavior': details['Number of Orders'].describe().to_frame()
+    }
+
+def pandas_writer(path, details):
+    """The previous create_excel_report path: every sheet through pd.ExcelWriter"""
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, df in summary_sheets(details).items():
+            df.to_excel(writer, sheet_name=name)
+        details.to_excel(writer, sheet_name='Customer Details', index=False)
+
+def streaming_writer(path, details):
+    """Write-only workbook fed in row batches by a background thread"""
+    with StreamingWorkbook(path) as workbook:
+        for name, df in summary_sheets(details).items():
+            workbook.add_frame(name, df)
+        frames = (details.iloc[start:start + BATCH_ROWS] for start in range(0, len(details), BATCH_ROWS))
+        workbook.add_frames('Customer Details', frames, index=False)
+
+def measure(writer, details, directory):
+    path = os.path.join(directory, f'{writer.__name__}.xlsx')
+    start = time.perf_counter()
+    writer(path, details)
+    seconds = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / 1024 ** 2
+
+    tracemalloc.start()
+    writer(path, details)
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    tracemalloc.stop()
+    return seconds, peak_mb, size_mb
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=50_000)
+    args = parser.parse_args()
+
+    details = make_customer_details(args.customers)
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_time, legacy_peak, legacy_size = measure(pandas_writer, details, directory)
+        stream_time, stream_peak, stream_size = measure(streaming_writer, details, directory)
+
+    print(f"{args.customers:,} customer rows")
+    print(f"  pd.ExcelWriter:     {legacy_time:8.2f} s  {legacy_peak:8.1f} MB peak  {legacy_size:6.1f} MB file")
+    print(f"  StreamingWorkbook:  {stream_time:8.2f} s  {stream_peak:8.1f} MB peak  {stream_size:6.1f} MB file")
+    print(f"  speedup:            {legacy_time / stream_time:8.1f}x")
+    print(f"  memory reduction:   {legacy_peak / stream_peak:8.1f}x")
+
+if __name__ == "__main__":
+    main()
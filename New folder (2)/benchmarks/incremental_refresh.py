@@ -0,0 +1,71 @@
+"""Check that an incremental refresh after an append parses only the appended rows.
+
+Run from the project directory:
+    python -m benchmarks.incremental_refresh --rows 1000000 --appended 10000
+
+A CSV of --rows orders is folded once, --appended more orders are appended,
+and the refresh is timed against a full load of the grown file. The refresh
+must read exactly the appended bytes, never load the rows into the
+analyzer, and agree with the full load.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from ecommerce_analysis import EcommerceAnalyzer
+from generate_sample_data import iter_sample_chunks
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def incremental_analyzer(path):
+    analyzer = EcommerceAnalyzer(path, incremental=True)
+    analyzer.compute_aggregates()
+    return analyzer
+
+def full_analyzer(path):
+    analyzer = EcommerceAnalyzer(path, use_cache=False)
+    analyzer.clean_data()
+    analyzer.compute_aggregates()
+    return analyzer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--appended', type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'orders.csv')
+        base, *rest = iter_sample_chunks(args.rows + args.appended, seed=0, chunk_rows=args.rows)
+        appended = pd.concat(rest, ignore_index=True)
+        base.to_csv(path, index=False)
+        _, initial_time = timed(incremental_analyzer, path)
+
+        size_before = os.path.getsize(path)
+        appended.to_csv(path, mode='a', header=False, index=False)
+        appended_bytes = os.path.getsize(path) - size_before
+
+        analyzer, refresh_time = timed(incremental_analyzer, path)
+        assert analyzer.df is None, "incremental refresh loaded the order rows"
+        assert analyzer.aggregator.bytes_read == appended_bytes, (
+            f"refresh parsed {analyzer.aggregator.bytes_read:,} bytes, {appended_bytes:,} were appended")
+
+        full, full_time = timed(full_analyzer, path)
+        assert analyzer.row_count() == full.row_count(), "row counts disagree"
+        pd.testing.assert_frame_equal(analyzer.analyze_top_products(), full.analyze_top_products())
+        pd.testing.assert_frame_equal(analyzer.analyze_regional_performance(),
+                                      full.analyze_regional_performance())
+
+    print(f"{args.rows:,} orders + {args.appended:,} appended ({appended_bytes / 1024 ** 2:.2f} MB)")
+    print(f"  initial fold:         {initial_time:8.3f} s")
+    print(f"  refresh after append: {refresh_time:8.3f} s")
+    print(f"  full load:            {full_time:8.3f} s")
+
+if __name__ == "__main__":
+    main()
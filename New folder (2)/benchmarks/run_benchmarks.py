@@ -0,0 +1,185 @@
+"""Benchmark loading, cleaning, analysis and reporting over growing datasets.
+
+Run from the project directory:
+    python -m benchmarks.run_benchmarks --sizes 1000 100000 1000000 --backends pandas sql
+
+Each (size, backend) pair runs in a fresh subprocess so peak RSS is per run.
+The size 1000 uses the bundled data/ecommerce_data.csv; larger datasets are
+generated once with a fixed seed into benchmarks/data/. Results are printed
+and saved as JSON in benchmarks/results/.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_DATA = os.path.join(PROJECT_DIR, 'data', 'ecommerce_data.csv')
+DATA_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'data')
+RESULTS_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'results')
+BACKENDS = ['pandas', 'parallel', 'streaming', 'sql']
+ANALYSES = [
+    'analyze_top_products',
+    'analyze_revenue_trends',
+    'analyze_regional_performance',
+    'analyze_payment_methods',
+    'analyze_peak_periods',
+    'analyze_customer_behavior'
+]
+
+def dataset_for(size):
+    """Path of a CSV with `size` orders, generating it on first use"""
+    if size == 1000:
+        return BUNDLED_DATA
+    path = os.path.join(DATA_DIR, f'orders_{size}.csv')
+    if not os.path.exists(path):
+        from generate_sample_data import generate_sample_data
+        generate_sample_data(size, seed=size, output_path=path)
+    return path
+
+def make_analyzer(backend, data_path, workdir):
+    if backend == 'pandas':
+        from ecommerce_analysis import EcommerceAnalyzer
+        return EcommerceAnalyzer(data_path, use_cache=False)
+    if backend == 'parallel':
+        from ecommerce_analysis import EcommerceAnalyzer
+        return EcommerceAnalyzer(data_path, use_cache=False, workers=os.cpu_count())
+    if backend == 'streaming':
+        from streaming import StreamingAnalyzer
+        return StreamingAnalyzer(data_path)
+    if backend == 'sql':
+        from sql_backend import SQLAnalyzer
+        return SQLAnalyzer(data_path, database=os.path.join(workdir, 'orders.sqlite'))
+    raise ValueError(f"Unknown backend: {backend}")
+
+def run_worker(size, backend, data_path):
+    """Time every stage for one dataset and backend; runs inside its own process"""
+    workdir = tempfile.mkdtemp(prefix='ecommerce_bench_')
+    # create_excel_report and the dashboard read data/ecommerce_data.csv from the working directory
+    os.makedirs(os.path.join(workdir, 'data'))
+    try:
+        os.symlink(data_path, os.path.join(workdir, 'data', 'ecommerce_data.csv'))
+    except OSError:
+        shutil.copy(data_path, os.path.join(workdir, 'data', 'ecommerce_data.csv'))
+    os.chdir(workdir)
+    stages = []
+
+    # Import every backend up front so module import time is not counted as loading
+    import ecommerce_analysis, streaming, sql_backend  # noqa: F401
+    from instrumentation import current_rss_mb, peak_rss_mb
+
+    def measure(stage, func):
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        rss_after = current_rss_mb()
+        stages.append({
+            'size': size,
+            'backend': backend,
+            'stage': stage,
+            'seconds': seconds,
+            'rows_per_sec': size / seconds if seconds > 0 else None,
+            'rss_delta_mb': rss_after - rss_before if rss_before is not None else None,
+            'peak_rss_mb': peak_rss_mb()
+        })
+        return result
+
+    analyzer = measure('load_data', lambda: make_analyzer(backend, data_path, workdir))
+    measure('clean_data', analyzer.clean_data)
+    measure('compute_aggregates', analyzer.compute_aggregates)
+    for analysis in ANALYSES:
+        measure(analysis, getattr(analyzer, analysis))
+    measure('generate_report', analyzer.generate_report)
+    measure('create_visualizations', analyzer.create_visualizations)
+
+    # Report and dashboard always use the default analyzer, so run them once per size
+    if backend == 'pandas':
+        from create_excel_report import create_excel_report
+        measure('create_excel_report', create_excel_report)
+        try:
+            from streamlit.testing.v1 import AppTest
+        except ImportError:
+            AppTest = None
+        if AppTest is not None:
+            app = AppTest.from_file(os.path.join(PROJECT_DIR, 'app.py'), default_timeout=3600)
+            measure('dashboard_render', app.run)
+
+    os.chdir(PROJECT_DIR)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return stages
+
+def run_all(sizes, backends):
+    results = []
+    for size in sizes:
+        data_path = dataset_for(size)
+        for backend in backends:
+            print(f"Benchmarking {backend} on {size:,} rows...")
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as out:
+                out_path = out.name
+            subprocess.run([
+                sys.executable, '-m', 'benchmarks.run_benchmarks', '--worker',
+                '--size', str(size), '--backend', backend, '--data', data_path, '--out', out_path
+            ], cwd=PROJECT_DIR, check=True, stdout=subprocess.DEVNULL)
+            with open(out_path) as f:
+                results.extend(json.load(f))
+            os.remove(out_path)
+    return results
+
+def print_results(results):
+    print(f"\n{'size':>12} {'backend':<10} {'stage':<30} {'seconds':>10} {'rows/sec':>14} {'peak RSS MB':>12}")
+    for r in results:
+        rows_per_sec = f"{r['rows_per_sec']:,.0f}" if r['rows_per_sec'] else '-'
+        peak = f"{r['peak_rss_mb']:,.1f}" if r['peak_rss_mb'] is not None else '-'
+        print(f"{r['size']:>12,} {r['backend']:<10} {r['stage']:<30} {r['seconds']:>10.4f} {rows_per_sec:>14} {peak:>12}")
+
+def save_results(results):
+    import numpy as np
+    import pandas as pd
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump({
+            'machine': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'cpu_count': os.cpu_count()
+            },
+            'results': results
+        }, f, indent=2)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the e-commerce analysis pipeline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['pandas'])
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, PROJECT_DIR)
+    if args.worker:
+        import matplotlib
+        matplotlib.use('Agg')
+        results = run_worker(args.size, args.backend, args.data)
+        with open(args.out, 'w') as f:
+            json.dump(results, f)
+        return
+
+    results = run_all(args.sizes, args.backends)
+    print_results(results)
+    print(f"\nResults saved to {save_results(results)}")
+
+if __name__ == "__main__":
+    main()
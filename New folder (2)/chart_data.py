@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+# Most categories drawn in one chart; the rest are folded into a single "Other" entry
+MAX_CATEGORIES = 15
+# Most points sent to the browser for one line trace
+MAX_POINTS = 2_000
+OTHER_LABEL = 'Other'
+
+def top_n(data, column=None, n=MAX_CATEGORIES, other=True, ratios=None):
+    """Keep the n largest categories of a Series or DataFrame, folding the rest into "Other".
+
+    Rows are ranked by `column` (the values of a Series). The "Other" row
+    holds the sums of the folded rows, and `ratios` maps a column to the
+    (numerator, denominator) columns it is recomputed from, since averages
+    cannot be summed. A denominator of None is recovered from each folded
+    row as numerator / ratio, for tables that hold the average but not its
+    count. With other=False the rest is dropped instead.
+    """
+    if len(data) <= n:
+        return data
+    ranked = data.sort_values(column, ascending=False, kind='stable') if column else \
+        data.sort_values(ascending=False, kind='stable')
+    keep = n - 1 if other else n
+    head, rest = ranked.iloc[:keep], ranked.iloc[keep:]
+    if not other:
+        return head
+
+    index = pd.Index([OTHER_LABEL], name=data.index.name)
+    if isinstance(data, pd.Series):
+        folded = pd.Series([rest.sum()], index=index, name=data.name)
+    else:
+        totals = rest.sum(numeric_only=True)
+        for ratio, (numerator, denominator) in (ratios or {}).items():
+            if denominator is None:
+                # Rows whose ratio is zero or missing add nothing to the numerator either
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    counts = rest[numerator] / rest[ratio]
+                count = counts[np.isfinite(counts)].sum()
+            else:
+                count = totals[denominator]
+            totals[ratio] = totals[numerator] / count if count else np.nan
+        folded = pd.DataFrame([totals], index=index)[data.columns].astype(data.dtypes.to_dict())
+    head = head.set_axis(head.index.astype(object))
+    return pd.concat([head, folded])
+
+def lttb(x, y, threshold):
+    """Row positions picked by Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last point and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket, which preserves
+    the visual shape of the line. x must be sorted and numeric.
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, length - 1, threshold - 1).astype(int)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        picked[bucket + 1] = previous
+    return picked
+
+def downsample(series, max_points=MAX_POINTS):
+    """Reduce a Series indexed by time or number to at most max_points with LTTB"""
+    if len(series) <= max_points:
+        return series
+    index = series.index
+    if isinstance(index, (pd.PeriodIndex, pd.DatetimeIndex)):
+        x = index.asi8
+    else:
+        x = index.to_numpy()
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(values)
+    positions = np.flatnonzero(valid)[lttb(x[valid], values[valid], max_points)]
+    return series.iloc[positions]
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.style
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Bump when the drawing code changes so every chart is redrawn once
+CHART_VERSION = 1
+# Input hash of every chart drawn into a directory, keyed by file name
+HASH_FILE = '.chart_hashes.json'
+
+def bar_chart(filename, data, title, xlabel, ylabel, figsize=(12, 6), rotate=45):
+    """Spec for a bar chart of a Series indexed by category"""
+    return {'kind': 'bar', 'filename': filename, 'data': data, 'title': title,
+            'xlabel': xlabel, 'ylabel': ylabel, 'figsize': figsize, 'rotate': rotate}
+
+def line_chart(filename, data, title, xlabel, ylabel, figsize=(12, 6)):
+    """Spec for a line chart with markers of a Series indexed by period"""
+    return {'kind': 'line', 'filename': filename, 'data': data, 'title': title,
+            'xlabel': xlabel, 'ylabel': ylabel, 'figsize': figsize, 'rotate': 0}
+
+def chart_hash(chart):
+    """Hash of everything that affects the rendered image of a chart"""
+    data = chart['data']
+    inputs = {key: value for key, value in chart.items() if key != 'data'}
+    inputs.update(
+        version=CHART_VERSION,
+        matplotlib=matplotlib.__version__,
+        seaborn=sns.__version__,
+        index=[str(label) for label in data.index],
+        values=[float(value) for value in data.to_numpy()]
+    )
+    return hashlib.blake2b(json.dumps(inputs, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+def draw_chart(chart, path):
+    """Render one chart to a PNG without pyplot, so it works headless and in any process"""
+    data = chart['data']
+    labels = [str(label) for label in data.index]
+    with matplotlib.style.context('default'), sns.axes_style('whitegrid'):
+        fig = Figure(figsize=chart['figsize'])
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        if chart['kind'] == 'bar':
+            sns.barplot(x=labels, y=data.to_numpy(), ax=ax)
+        else:
+            # Plot against positions so period labels are not parsed back into dates
+            positions = range(len(labels))
+            ax.plot(positions, data.to_numpy(), marker='o')
+            ax.set_xticks(positions, labels)
+            ax.grid(True)
+        ax.set_title(chart['title'])
+        ax.set_xlabel(chart['xlabel'])
+        ax.set_ylabel(chart['ylabel'])
+        if chart['rotate']:
+            ax.tick_params(axis='x', labelrotation=chart['rotate'])
+        fig.tight_layout()
+        fig.savefig(path)
+    return path
+
+def _read_hashes(directory):
+    try:
+        with open(os.path.join(directory, HASH_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_hashes(directory, hashes):
+    path = os.path.join(directory, HASH_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+def render_charts(charts, directory='visualizations', workers=None):
+    """Draw the charts whose inputs changed since they were last drawn into directory.
+
+    A chart is skipped when its PNG exists and the input hash recorded in
+    the sidecar file matches. The others are drawn in a process pool, one
+    chart per task. Returns the file names that were redrawn.
+    """
+    os.makedirs(directory, exist_ok=True)
+    hashes = _read_hashes(directory)
+    stale = {}
+    for chart in charts:
+        digest = chart_hash(chart)
+        path = os.path.join(directory, chart['filename'])
+        if hashes.get(chart['filename']) != digest or not os.path.exists(path):
+            stale[chart['filename']] = (chart, path, digest)
+    if not stale:
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(stale))
+    jobs = [(chart, path) for chart, path, _ in stale.values()]
+    if workers < 2:
+        for chart, path in jobs:
+            draw_chart(chart, path)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(draw_chart, *zip(*jobs)))
+
+    hashes.update({filename: digest for filename, (_, _, digest) in stale.items()})
+    _write_hashes(directory, hashes)
+    return list(stale)
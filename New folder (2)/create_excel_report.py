@@ -1,20 +1,48 @@
+import argparse
+import logging
 import pandas as pd
 from ecommerce_analysis import EcommerceAnalyzer
+from excel_writer import StreamingWorkbook, BATCH_ROWS
 from datetime import datetime
 
-def create_excel_report():
+def customer_detail_frames(analyzer, batch_rows=BATCH_ROWS):
+    """Per-customer metrics and preferences, highest lifetime value first, batch_rows customers at a time"""
+    aggregates = analyzer.aggregates
+    metrics = aggregates.customer_metrics().sort_values('customer_lifetime', ascending=False, kind='stable')
+    cities = aggregates.preferred('city')
+    payments = aggregates.preferred('payment_method')
+    segments = analyzer.analyze_customer_segments()['customers']['segment']
+    for start in range(0, len(metrics), batch_rows):
+        batch = metrics.iloc[start:start + batch_rows]
+        details = pd.DataFrame({
+            'customer_id': batch.index,
+            'Number of Orders': batch['purchase_frequency'].to_numpy(),
+            'Total Revenue (₹)': batch['customer_lifetime'].round(2).to_numpy(),
+            'Avg Order Value (₹)': batch['avg_order_value'].round(2).to_numpy(),
+            'Preferred City': cities.reindex(batch.index).to_numpy(),
+            'Preferred Payment Method': payments.reindex(batch.index).to_numpy(),
+            'Segment': segments.reindex(batch.index).astype(str).to_numpy()
+        })
+        yield analyzer.decode_ids(details)
+
+def create_excel_report(incremental=False, customer_details=True):
     # Initialize analyzer
-    analyzer = EcommerceAnalyzer('data/ecommerce_data.csv')
+    analyzer = EcommerceAnalyzer('data/ecommerce_data.csv', incremental=incremental)
     analyzer.clean_data()
 
     # Create Excel writer object
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     excel_file = f'ecommerce_analysis_{timestamp}.xlsx'
     
-    # Create a dictionary to store all DataFrames
-    sheets = {}
-    
+    # Sheets are written by a background thread while the next one is computed
+    with StreamingWorkbook(excel_file) as workbook:
+        write_report_sheets(analyzer, workbook, customer_details)
+
+    print(f"Excel report has been generated: {excel_file}")
+
+def write_report_sheets(analyzer, workbook, customer_details=True):
     # 1. Overview Sheet
+    overview = analyzer.aggregates.overview()
     overview_data = {
         'Metric': [
             'Total Orders',
@@ -24,36 +52,46 @@ def create_excel_report():
             'Repeat Customers'
         ],
         'Value': [
-            analyzer.df.shape[0],
-            analyzer.df['total_price'].sum(),
-            analyzer.df['total_price'].mean(),
-            analyzer.df['customer_id'].nunique(),
-            len(analyzer.df[analyzer.df.duplicated(subset=['customer_id'], keep=False)]['customer_id'].unique())
+            overview['total_orders'],
+            overview['total_revenue'],
+            overview['average_order_value'],
+            overview['total_customers'],
+            overview['repeat_customers']
         ]
     }
-    sheets['Overview'] = pd.DataFrame(overview_data)
+    workbook.add_frame('Overview', pd.DataFrame(overview_data))
 
     # 2. Product Analysis
-    sheets['Product Analysis'] = analyzer.analyze_top_products()
+    workbook.add_frame('Product Analysis', analyzer.analyze_top_products())
 
     # 3. Regional Analysis
-    sheets['Regional Analysis'] = analyzer.analyze_regional_performance()
+    workbook.add_frame('Regional Analysis', analyzer.analyze_regional_performance())
 
     # 4. Payment Analysis
-    sheets['Payment Analysis'] = analyzer.analyze_payment_methods()
+    workbook.add_frame('Payment Analysis', analyzer.analyze_payment_methods())
+
+    # 5. Peak Sales Periods
+    workbook.add_frame('Sales by Day', analyzer.analyze_peak_periods()['day_of_week'])
 
-    # 5. Customer Behavior
+    # 6. Customer Behavior
     customer_behavior = analyzer.analyze_customer_behavior()
     purchase_freq = pd.DataFrame(customer_behavior['purchase_frequency'].describe())
     purchase_freq.columns = ['Purchase Frequency Stats']
-    sheets['Customer Behavior'] = purchase_freq
+    workbook.add_frame('Customer Behavior', purchase_freq)
 
-    # Write all sheets to Excel
-    with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-        for sheet_name, df in sheets.items():
-            df.to_excel(writer, sheet_name=sheet_name)
+    # 7. Customer Segments (RFM scores clustered with mini-batch k-means)
+    workbook.add_frame('Customer Segments', analyzer.analyze_customer_segments()['summary'])
 
-    print(f"Excel report has been generated: {excel_file}")
+    # 8. Customer Details, continued on further sheets past Excel's row limit
+    if customer_details:
+        workbook.add_frames('Customer Details', customer_detail_frames(analyzer), index=False)
 
 if __name__ == "__main__":
-    create_excel_report() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the Excel analysis report")
+    parser.add_argument('--incremental', action='store_true',
+                        help="reuse persisted aggregates and fold in only newly appended orders")
+    parser.add_argument('--no-customer-details', action='store_true',
+                        help="skip the per-customer detail sheets")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    create_excel_report(incremental=args.incremental, customer_details=not args.no_customer_details) 
\ No newline at end of file
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Bump when clean_data changes the columns it derives so old caches are rebuilt
+CACHE_VERSION = 2
+
+def cache_paths(data_path):
+    """Return the sidecar table and metadata paths for a source file"""
+    return f"{data_path}.cache.arrow", f"{data_path}.cache.json"
+
+def file_hash(path, block_size=1 << 20):
+    """Hash the contents of a file without reading it into memory at once"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_fingerprint(data_path, with_hash=True):
+    """Describe the source file by size, modification time and content hash"""
+    stat = os.stat(data_path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        fingerprint['hash'] = file_hash(data_path)
+    return fingerprint
+
+def source_matches(data_path, fingerprint):
+    """Whether the source file still matches a fingerprint taken by source_fingerprint"""
+    current = source_fingerprint(data_path, with_hash=False)
+    if current['size'] != fingerprint['size']:
+        return False
+    # A matching size and mtime is trusted; otherwise confirm with the content hash
+    return current['mtime_ns'] == fingerprint['mtime_ns'] or file_hash(data_path) == fingerprint['hash']
+
+def _read_metadata(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_cached_frame(data_path):
+    """Return (df, metadata) from the sidecar cache, or None if it is missing or stale"""
+    if feather is None:
+        return None
+    table_path, meta_path = cache_paths(data_path)
+    meta = _read_metadata(meta_path)
+    if meta is None or meta.get('version') != CACHE_VERSION or not os.path.exists(table_path):
+        return None
+
+    if not source_matches(data_path, meta['source']):
+        return None
+
+    df = feather.read_table(table_path, memory_map=True).to_pandas()
+    return df, meta
+
+def save_cached_frame(data_path, df, source=None, **metadata):
+    """Write the cleaned frame and the fingerprint of the file it was read from"""
+    if feather is None:
+        return False
+    table_path, meta_path = cache_paths(data_path)
+    meta = {
+        'version': CACHE_VERSION,
+        'source': source or source_fingerprint(data_path),
+        **metadata
+    }
+
+    # Write to temporary files first so readers never see a half-written cache
+    feather.write_feather(df, f"{table_path}.tmp", compression='uncompressed')
+    with open(f"{meta_path}.tmp", 'w') as f:
+        json.dump(meta, f)
+    os.replace(f"{table_path}.tmp", table_path)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    return True
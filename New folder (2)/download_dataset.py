@@ -1,67 +1,165 @@
-import pandas as pd
+import argparse
 import os
-from kaggle.api.kaggle_api_extended import KaggleApi
 
-def download_dataset():
+import numpy as np
+import pandas as pd
+
+from export import format_for_path, write_chunks
+from storage import is_order_store, write_order_store
+
+# Olist tables read by prepare_dataset: file name and the only columns read, with their dtypes
+OLIST_TABLES = {
+    'orders': ('olist_orders_dataset.csv',
+               {'order_id': str, 'customer_id': str, 'order_purchase_timestamp': str}),
+    'customers': ('olist_customers_dataset.csv',
+                  {'customer_id': str, 'customer_unique_id': str, 'customer_city': str}),
+    'products': ('olist_products_dataset.csv',
+                 {'product_id': str, 'product_category_name': str}),
+    'payments': ('olist_order_payments_dataset.csv',
+                 {'order_id': str, 'payment_sequential': 'int16', 'payment_type': str, 'payment_value': 'float64'}),
+    'order_items': ('olist_order_items_dataset.csv',
+                    {'order_id': str, 'product_id': str, 'price': 'float64'})
+}
+# Optional English names of the Portuguese product categories
+TRANSLATION_FILE = 'product_category_name_translation.csv'
+# Olist payment types -> payment_method labels; other types are title-cased
+PAYMENT_METHODS = {
+    'credit_card': 'Credit Card',
+    'debit_card': 'Debit Card',
+    'boleto': 'Boleto',
+    'voucher': 'Voucher',
+    'not_defined': 'Not Defined'
+}
+# order_items rows joined and written at a time; bounds the memory of the large side of the join
+ITEM_CHUNK_ROWS = 200_000
+
+def download_dataset(data_dir='data', output_path='data/ecommerce_data.csv'):
     """Download the e-commerce dataset from Kaggle"""
     try:
+        # Only needed for the download, so preparing local files works without it
+        from kaggle.api.kaggle_api_extended import KaggleApi
+
         # Initialize Kaggle API
         api = KaggleApi()
         api.authenticate()
-        
+
         # Download the dataset
         dataset_name = "olistbr/brazilian-ecommerce"
-        api.dataset_download_files(dataset_name, path='data', unzip=True)
-        
+        api.dataset_download_files(dataset_name, path=data_dir, unzip=True)
+
         print("Dataset downloaded successfully!")
-        
+
         # Prepare the dataset
-        prepare_dataset()
-        
+        prepare_dataset(data_dir, output_path)
+
     except Exception as e:
         print(f"Error downloading dataset: {e}")
 
-def prepare_dataset():
-    """Prepare the dataset for analysis"""
+def _read_table(data_dir, name, **read_kwargs):
+    filename, dtypes = OLIST_TABLES[name]
+    return pd.read_csv(os.path.join(data_dir, filename), usecols=list(dtypes), dtype=dtypes, **read_kwargs)
+
+def order_dimension(data_dir='data'):
+    """One row per order with its customer, city, payment method and purchase time, indexed by order_id"""
+    orders = _read_table(data_dir, 'orders').drop_duplicates('order_id')
+    customers = _read_table(data_dir, 'customers').drop_duplicates('customer_id').set_index('customer_id')
+
+    # Hash join of the orders against the customer table; orders of unknown customers are dropped
+    positions = customers.index.get_indexer(orders['customer_id'])
+    orders = orders[positions >= 0]
+    customers = customers.iloc[positions[positions >= 0]]
+
+    # An order paid in several parts is labelled with the method that paid the most
+    payments = _read_table(data_dir, 'payments')
+    payments = payments.sort_values(['order_id', 'payment_value', 'payment_sequential'],
+                                    ascending=[True, False, True], kind='stable')
+    payment_types = payments.drop_duplicates('order_id').set_index('order_id')['payment_type']
+    labels = {kind: PAYMENT_METHODS.get(kind, kind.replace('_', ' ').title()) for kind in payment_types.unique()}
+
+    return pd.DataFrame({
+        'customer_id': orders['customer_id'].to_numpy(),
+        'customer_name': customers['customer_unique_id'].to_numpy(),
+        'city': customers['customer_city'].str.title().to_numpy(),
+        'payment_method': payment_types.map(labels).reindex(orders['order_id']).to_numpy(),
+        'order_date': pd.to_datetime(orders['order_purchase_timestamp']).to_numpy()
+    }, index=pd.Index(orders['order_id'], name='order_id')).astype({
+        # Categoricals keep the dimension small and give every output chunk the same dictionary
+        'customer_id': 'category',
+        'customer_name': 'category',
+        'city': 'category',
+        'payment_method': 'category'
+    })
+
+def product_dimension(data_dir='data'):
+    """Readable category name of every product, indexed by product_id"""
+    products = _read_table(data_dir, 'products').drop_duplicates('product_id')
+    names = products['product_category_name']
+    translation_path = os.path.join(data_dir, TRANSLATION_FILE)
+    if os.path.exists(translation_path):
+        translation = pd.read_csv(translation_path, dtype=str).set_index('product_category_name')
+        names = names.map(translation['product_category_name_english']).fillna(names)
+    names = names.str.replace('_', ' ').str.title()
+    return pd.Series(names.to_numpy(), index=pd.Index(products['product_id'], name='product_id'),
+                     name='product_name', dtype='category')
+
+def iter_prepared_chunks(data_dir='data', chunk_rows=ITEM_CHUNK_ROWS):
+    """Yield the analyzer's order rows, streaming order_items and joining each chunk in turn.
+
+    Only the order and product dimensions are held in memory. Every item
+    row is one unit, so quantity is 1 and total_price is the item price.
+    Items whose order, customer or product is unknown are dropped.
+    """
+    orders = order_dimension(data_dir)
+    products = product_dimension(data_dir)
+    for items in _read_table(data_dir, 'order_items', chunksize=chunk_rows):
+        # Hash joins: position of each item's order and product in the dimension tables
+        order_rows = orders.index.get_indexer(items['order_id'])
+        product_rows = products.index.get_indexer(items['product_id'])
+        matched = (order_rows >= 0) & (product_rows >= 0)
+        if not matched.any():
+            continue
+        items = items[matched]
+        order = orders.iloc[order_rows[matched]]
+        yield pd.DataFrame({
+            'order_id': items['order_id'].to_numpy(),
+            'customer_id': order['customer_id'].array,
+            'customer_name': order['customer_name'].array,
+            'product_id': items['product_id'].to_numpy(),
+            'product_name': products.iloc[product_rows[matched]].array,
+            'quantity': np.ones(len(items), dtype=np.int64),
+            'city': order['city'].array,
+            'payment_method': order['payment_method'].array,
+            'order_date': order['order_date'].to_numpy(),
+            'total_price': items['price'].to_numpy()
+        })
+
+def prepare_dataset(data_dir='data', output_path='data/ecommerce_data.csv', chunk_rows=ITEM_CHUNK_ROWS):
+    """Prepare the dataset for analysis.
+
+    The Olist files in data_dir are joined chunk by chunk and written to
+    output_path as CSV, gzipped CSV (.csv.gz), Parquet (.parquet) or a
+    month-partitioned order store (.orders, see storage.py).
+    """
     try:
-        # Read the necessary files
-        orders = pd.read_csv('data/olist_orders_dataset.csv')
-        order_items = pd.read_csv('data/olist_order_items_dataset.csv')
-        customers = pd.read_csv('data/olist_customers_dataset.csv')
-        products = pd.read_csv('data/olist_products_dataset.csv')
-        
-        # Merge the datasets
-        df = pd.merge(orders, order_items, on='order_id')
-        df = pd.merge(df, customers, on='customer_id')
-        df = pd.merge(df, products, on='product_id')
-        
-        # Select and rename columns
-        df = df[[
-            'order_id',
-            'customer_id',
-            'customer_unique_id',
-            'product_id',
-            'product_category_name',
-            'price',
-            'order_purchase_timestamp'
-        ]]
-        
-        df.columns = [
-            'order_id',
-            'customer_id',
-            'customer_name',
-            'product_id',
-            'product_name',
-            'total_price',
-            'order_date'
-        ]
-        
-        # Save the prepared dataset
-        df.to_csv('data/ecommerce_data.csv', index=False)
-        print("Dataset prepared and saved successfully!")
-        
+        chunks = iter_prepared_chunks(data_dir, chunk_rows)
+        if is_order_store(output_path):
+            rows = write_order_store(chunks, output_path)
+        else:
+            rows = write_chunks(chunks, output_path, format_for_path(output_path))
+        print(f"Dataset prepared and saved successfully! ({rows} rows in {output_path})")
+
     except Exception as e:
         print(f"Error preparing dataset: {e}")
 
 if __name__ == "__main__":
-    download_dataset() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download and prepare the Olist e-commerce dataset")
+    parser.add_argument('--data-dir', default='data', help="directory holding the Olist CSV files")
+    parser.add_argument('--output', default='data/ecommerce_data.csv', help="CSV, .csv.gz, .parquet or .orders output path")
+    parser.add_argument('--skip-download', action='store_true',
+                        help="prepare the files already in --data-dir (e.g. data/olist_sample)")
+    parser.add_argument('--chunk-rows', type=int, default=ITEM_CHUNK_ROWS, help="order_items rows joined at a time")
+    args = parser.parse_args()
+    if args.skip_download:
+        prepare_dataset(args.data_dir, args.output, args.chunk_rows)
+    else:
+        download_dataset(args.data_dir, args.output)
@@ -1,203 +1,375 @@
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime
-import os
+import logging
+import data_cache
+import shared_store
+import storage
+from aggregation import OrderAggregates
+from charts import bar_chart, line_chart, render_charts
+from incremental import IncrementalAggregator
+from instrumentation import instrumented
+from parallel import parallel_aggregates
+from segmentation import DEFAULT_SEGMENTS
+from timeseries import RevenueSeries
+from order_data import (
+    memory_usage_mb, untyped_memory_mb, decode_prefixed_ids, read_orders, compact_columns, parse_order_date
+)
+
+logger = logging.getLogger(__name__)
 
 class EcommerceAnalyzer:
-    def __init__(self, data_path):
+    def __init__(self, data_path, use_cache=True, workers=None, partition_by='customer',
+                 incremental=False, approximate=False, shared=False, date_range=None, metrics=None):
         self.data_path = data_path
+        self.use_cache = use_cache
+        # Attach the cleaned orders zero-copy from the shared column store (see shared_store.py)
+        self.shared = shared
+        # Opt-in process pool for computing the aggregates ('customer' or 'date' partitions)
+        self.workers = workers
+        self.partition_by = partition_by
+        # Keep persisted aggregates and fold in only rows appended to the file; no rows are held
+        self.incremental = incremental
+        # Answer customer questions from bounded-memory sketches instead of per-customer tables
+        self.approximate = approximate
+        if incremental and approximate:
+            raise ValueError("approximate mode cannot be combined with incremental aggregation")
+        # A month-partitioned order store (see storage.py) is read pruned to the months in
+        # date_range (start, end) and to the columns the listed metrics need
+        self.order_store = storage.is_order_store(data_path)
+        self.date_range = date_range
+        self.metrics = metrics
+        if (date_range is not None or metrics is not None) and not self.order_store:
+            raise ValueError("date_range and metrics can only prune a partitioned order store")
+        self.columns = storage.columns_for(metrics)
+        if incremental and self.order_store:
+            raise ValueError("incremental aggregation follows rows appended to a CSV file, not an order store")
         self.df = None
+        self.encoded_ids = {}
+        self.memory_report = None
+        self.is_clean = False
+        self.source_fingerprint = None
+        self._aggregates = None
+        self._revenue_series = None
+        self.aggregator = None
         self.load_data()
         
+    def row_count(self):
+        """Number of order rows behind the analysis, or None before anything is loaded"""
+        if self.df is not None:
+            return len(self.df)
+        if self._aggregates is not None:
+            return int(self._aggregates.cube['rows'].sum())
+        return None
+
+    @instrumented
     def load_data(self):
-        """Load the e-commerce dataset"""
+        """Load the e-commerce dataset with a compact, typed schema"""
+        self.is_clean = False
+        self._aggregates = None
+        self._revenue_series = None
+        if self.order_store:
+            self._load_from_order_store()
+            return
+        if self.incremental:
+            # compute_aggregates folds only the rows appended since the last refresh
+            return
+        if self.shared and self._load_from_store():
+            return
+        if self.use_cache and not self.shared and self._load_from_cache():
+            return
+        try:
+            if self.shared or (self.use_cache and data_cache.feather is not None):
+                self.source_fingerprint = data_cache.source_fingerprint(self.data_path)
+            self.df = read_orders(self.data_path)
+            self.encoded_ids = compact_columns(self.df)
+            # before_mb is what a plain read_csv would have taken, estimated from an untyped sample
+            self.memory_report = {
+                'before_mb': untyped_memory_mb(self.data_path, len(self.df)),
+                'after_mb': memory_usage_mb(self.df)
+            }
+            logger.info("Data loaded successfully! %s rows, %.2f MB (untyped) -> %.2f MB", f"{len(self.df):,}",
+                        self.memory_report['before_mb'], self.memory_report['after_mb'])
+        except Exception as e:
+            logger.error("Error loading data: %s", e)
+
+    def _load_from_order_store(self):
+        """Read only the partitions and columns that were asked for from the order store"""
+        try:
+            start, end = self.date_range or (None, None)
+            self.df, self.encoded_ids = storage.read_order_store(
+                self.data_path, start, end, columns=self.columns
+            )
+            memory = memory_usage_mb(self.df)
+            self.memory_report = {'before_mb': None, 'after_mb': memory}
+            logger.info("Data loaded from order store! %s rows, %.2f MB", f"{len(self.df):,}", memory)
+        except Exception as e:
+            logger.error("Error loading data: %s", e)
+
+    def _load_from_cache(self):
+        """Use the cleaned columnar cache if it matches the source file"""
+        try:
+            cached = data_cache.load_cached_frame(self.data_path)
+        except Exception as e:
+            logger.warning("Ignoring unreadable data cache: %s", e)
+            return False
+        if cached is None:
+            return False
+
+        self.df, meta = cached
+        self.encoded_ids = {column: tuple(fmt) for column, fmt in meta['encoded_ids'].items()}
+        self.source_fingerprint = meta['source']
+        memory = memory_usage_mb(self.df)
+        # Nothing was read from the CSV, so there is no untyped footprint to compare against
+        self.memory_report = {'before_mb': None, 'after_mb': memory}
+        self.is_clean = True
+        logger.info("Data loaded from cache! %s rows, %.2f MB", f"{len(self.df):,}", memory)
+        return True
+
+    def _load_from_store(self):
+        """Attach the current shared store version if it matches the source file"""
+        try:
+            attached = shared_store.attach_frame(self.data_path)
+        except Exception as e:
+            logger.warning("Ignoring unreadable shared store: %s", e)
+            return False
+        if attached is None:
+            return False
+
+        self.df, meta = attached
+        self.encoded_ids = {column: tuple(fmt) for column, fmt in meta['encoded_ids'].items()}
+        self.source_fingerprint = meta['source']
+        memory = memory_usage_mb(self.df)
+        # Nothing was read from the CSV, so there is no untyped footprint to compare against
+        self.memory_report = {'before_mb': None, 'after_mb': memory}
+        self.is_clean = True
+        logger.info("Data attached from shared store %s! %s rows, %.2f MB mapped",
+                    meta['store_version'], f"{len(self.df):,}", memory)
+        return True
+
+    def _publish_to_store(self):
+        """Publish the cleaned frame and attach it, so this process shares the mapped copy too"""
         try:
-            self.df = pd.read_csv(self.data_path)
-            print("Data loaded successfully!")
+            shared_store.publish_frame(
+                self.data_path,
+                self.df,
+                source=self.source_fingerprint,
+                encoded_ids=self.encoded_ids
+            )
         except Exception as e:
-            print(f"Error loading data: {e}")
+            logger.warning("Could not publish to shared store: %s", e)
+            return
+        self._load_from_store()
+
+    def _save_to_cache(self):
+        """Store the cleaned frame so the next start can skip parsing the CSV"""
+        try:
+            data_cache.save_cached_frame(
+                self.data_path,
+                self.df,
+                source=self.source_fingerprint,
+                encoded_ids=self.encoded_ids
+            )
+        except Exception as e:
+            logger.warning("Could not write data cache: %s", e)
+
+    def decode_ids(self, df):
+        """Return a copy of df with integer-coded ID columns restored to strings"""
+        df = df.copy()
+        for column, (prefix, width) in self.encoded_ids.items():
+            if column in df.columns:
+                df[column] = decode_prefixed_ids(df[column], prefix, width)
+        return df
             
+    @instrumented
     def clean_data(self):
         """Clean the dataset"""
-        if self.df is None:
+        if self.df is None or self.is_clean:
             return
             
-        # Convert date column to datetime
-        self.df['order_date'] = pd.to_datetime(self.df['order_date'])
-        
-        # Add derived columns
-        self.df['month'] = self.df['order_date'].dt.to_period('M')
-        self.df['day_of_week'] = self.df['order_date'].dt.day_name()
-        self.df['hour'] = self.df['order_date'].dt.hour
-        
-        print("Data cleaning completed!")
+        # month, day_of_week and hour are derived as compact codes when the aggregates are built
+        parse_order_date(self.df)
+        self.is_clean = True
+        self._aggregates = None
+        self._revenue_series = None
+        
+        # An order store is already typed and columnar, so it is neither cached nor republished
+        if not self.order_store:
+            if self.shared:
+                self._publish_to_store()
+            elif self.use_cache:
+                self._save_to_cache()
+        logger.info("Data cleaning completed!")
+
+    @instrumented
+    def compute_aggregates(self):
+        """Scan the data once into the group statistics shared by every analysis"""
+        if self._aggregates is None and self.incremental:
+            self.aggregator = IncrementalAggregator(self.data_path)
+            self._aggregates = self.aggregator.refresh()
+            self.encoded_ids = self.aggregator.state['encoded_ids']
+        elif self._aggregates is None and self.df is not None:
+            # Approximate mode builds only the sketches, never the per-customer tables
+            if self.workers:
+                self._aggregates = parallel_aggregates(self.df, self.workers, self.partition_by,
+                                                       sketches=self.approximate,
+                                                       customers=not self.approximate)
+            else:
+                self._aggregates = OrderAggregates.from_frame(self.df, sketches=self.approximate,
+                                                              customers=not self.approximate)
+        return self._aggregates
+
+    @property
+    def aggregates(self):
+        """Shared group statistics, computed on first use"""
+        if self._aggregates is not None:
+            return self._aggregates
+        return self.compute_aggregates()
+
+    def _require_columns(self, metric):
+        """Raise a ValueError if the orders were loaded without a column the metric needs"""
+        if self.df is None:
+            return
+        needed = storage.columns_for([metric])
+        missing = [column for column in needed if column not in self.df.columns]
+        if missing:
+            raise ValueError(f"{metric} needs the columns {', '.join(needed)} (not loaded: {', '.join(missing)}); "
+                             f"include '{metric}' in metrics")
         
+    @instrumented
     def analyze_top_products(self):
         """Analyze top selling products"""
-        if self.df is None:
+        if self.aggregates is None:
             return
+        self._require_columns('top_products')
             
         # Product revenue analysis
-        product_revenue = self.df.groupby('product_name').agg({
-            'total_price': 'sum',
-            'quantity': 'sum',
-            'order_id': 'count'
-        }).round(2)
-        
-        product_revenue.columns = ['Total Revenue (₹)', 'Units Sold', 'Number of Orders']
-        product_revenue = product_revenue.sort_values('Total Revenue (₹)', ascending=False)
-        
-        return product_revenue
-        
-    def analyze_revenue_trends(self):
-        """Analyze revenue trends over time"""
-        if self.df is None:
+        return self.aggregates.top_products()
+        
+    @property
+    def revenue_series(self):
+        """Prefix sums of the orders' revenue by date, built on first use"""
+        if self._revenue_series is None and self.df is not None:
+            self._revenue_series = RevenueSeries.from_frame(self.df)
+        return self._revenue_series
+
+    @instrumented
+    def analyze_revenue_trends(self, freq='M', compare='previous', window=None):
+        """Analyze revenue trends over time.
+
+        freq is a period frequency (D, W, M, Q, Y) and compare is 'previous'
+        or 'year'. With window, 'rolling' holds the revenue of the trailing
+        window of that many periods.
+        """
+        if self.aggregates is None:
             return
+        self._require_columns('revenue_trends')
             
-        # Monthly revenue trends
-        monthly_revenue = self.df.groupby('month')['total_price'].sum()
-        
-        # Calculate month-over-month growth
-        monthly_growth = monthly_revenue.pct_change() * 100
-        
-        return {
-            'revenue': monthly_revenue,
-            'growth': monthly_growth
+        # Monthly revenue and month-over-month growth
+        if freq == 'M' and compare == 'previous' and window is None:
+            return self.aggregates.revenue_trends()
+
+        # Other views are read from the order rows, which streaming and incremental analyzers never hold
+        if self.revenue_series is None:
+            raise ValueError("revenue trends other than monthly need the order rows")
+        trends = {
+            'revenue': self.revenue_series.resample(freq),
+            'growth': self.revenue_series.growth(freq, compare)
         }
+        if window is not None:
+            trends['rolling'] = self.revenue_series.rolling(freq, window)
+        return trends
         
+    @instrumented
     def analyze_regional_performance(self):
         """Analyze sales performance by region"""
-        if self.df is None:
+        if self.aggregates is None:
             return
+        self._require_columns('regional_performance')
             
         # City-wise analysis
-        city_metrics = self.df.groupby('city').agg({
-            'total_price': ['sum', 'mean', 'count'],
-            'order_id': 'count'
-        }).round(2)
-        
-        city_metrics.columns = ['Total Revenue (₹)', 'Avg Order Value (₹)', 
-                              'Number of Transactions', 'Number of Orders']
-        return city_metrics.sort_values('Total Revenue (₹)', ascending=False)
+        return self.aggregates.regional_performance()
         
+    @instrumented
     def analyze_payment_methods(self):
         """Analyze payment method preferences"""
-        if self.df is None:
+        if self.aggregates is None:
             return
+        self._require_columns('payment_methods')
             
-        payment_analysis = self.df.groupby('payment_method').agg({
-            'order_id': 'count',
-            'total_price': ['sum', 'mean']
-        }).round(2)
+        return self.aggregates.payment_methods()
         
-        payment_analysis.columns = ['Number of Orders', 'Total Revenue (₹)', 'Avg Order Value (₹)']
-        return payment_analysis.sort_values('Number of Orders', ascending=False)
+    @instrumented
+    def analyze_peak_periods(self):
+        """Identify peak sales days and hours"""
+        if self.aggregates is None:
+            return
+        self._require_columns('peak_periods')
+            
+        return self.aggregates.peak_periods()
         
+    @instrumented
     def analyze_customer_behavior(self):
         """Analyze customer purchasing behavior"""
-        if self.df is None:
+        if self.aggregates is None:
+            return
+        self._require_columns('customer_behavior')
+        if not self.aggregates.has_customers:
             return
             
-        # Customer purchase frequency
-        purchase_frequency = self.df.groupby('customer_id').size()
-        
-        # Average order value by customer
-        avg_order_value = self.df.groupby('customer_id')['total_price'].mean()
-        
-        # Customer lifetime value
-        customer_lifetime = self.df.groupby('customer_id')['total_price'].sum()
-        
-        # Customer city preference
-        customer_cities = self.df.groupby('customer_id')['city'].agg(lambda x: x.value_counts().index[0])
-        
-        # Preferred payment methods
-        customer_payments = self.df.groupby('customer_id')['payment_method'].agg(lambda x: x.value_counts().index[0])
-        
-        return {
-            'purchase_frequency': purchase_frequency.describe(),
-            'avg_order_value': avg_order_value.describe(),
-            'customer_lifetime': customer_lifetime.describe(),
-            'city_distribution': customer_cities.value_counts(),
-            'payment_preferences': customer_payments.value_counts()
-        }
+        # Purchase frequency, order value, lifetime value and city/payment preferences
+        return self.aggregates.customer_behavior()
+
+    @instrumented
+    def analyze_customer_segments(self, n_segments=DEFAULT_SEGMENTS):
+        """Segment customers by recency, frequency and monetary value"""
+        if self.aggregates is None:
+            return
+        self._require_columns('customer_segments')
+        # Segmentation needs every customer, so approximate aggregates cannot answer it
+        if self.aggregates.customers is None:
+            return
+
+        # RFM scores and mini-batch k-means clusters, kept with the aggregates until the data changes
+        return self.aggregates.customer_segments(n_segments)
         
-    def create_visualizations(self):
+    @instrumented
+    def create_visualizations(self, workers=None):
         """Create visualizations for the analysis"""
-        if self.df is None:
+        if self.aggregates is None:
             return
             
-        # Set style
-        plt.style.use('default')
-        sns.set_style("whitegrid")
-        
-        # Create directory for visualizations
-        os.makedirs('visualizations', exist_ok=True)
-        
-        # 1. Top Products Visualization
-        plt.figure(figsize=(12, 6))
+        # Chart inputs are small rollups of the shared aggregates
         top_products = self.analyze_top_products()
-        sns.barplot(x=top_products.index, y=top_products['Total Revenue (₹)'])
-        plt.title('Category-wise Revenue Distribution')
-        plt.xlabel('Product Category')
-        plt.ylabel('Revenue (₹)')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig('visualizations/category_revenue.png')
-        plt.close()
-        
-        # 2. Revenue Trends Visualization
         trends = self.analyze_revenue_trends()
-        plt.figure(figsize=(12, 6))
-        trends['revenue'].plot(kind='line', marker='o')
-        plt.title('Monthly Revenue Trends')
-        plt.xlabel('Month')
-        plt.ylabel('Revenue (₹)')
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig('visualizations/revenue_trends.png')
-        plt.close()
-        
-        # 3. Regional Performance
-        plt.figure(figsize=(12, 6))
         city_metrics = self.analyze_regional_performance()
-        sns.barplot(x=city_metrics.index, y=city_metrics['Total Revenue (₹)'])
-        plt.title('City-wise Revenue Distribution')
-        plt.xlabel('City')
-        plt.ylabel('Revenue (₹)')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig('visualizations/city_revenue.png')
-        plt.close()
-        
-        # 4. Payment Methods Analysis
-        plt.figure(figsize=(10, 6))
         payment_data = self.analyze_payment_methods()
-        sns.barplot(x=payment_data.index, y=payment_data['Number of Orders'])
-        plt.title('Payment Method Distribution')
-        plt.xlabel('Payment Method')
-        plt.ylabel('Number of Orders')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig('visualizations/payment_methods.png')
-        plt.close()
-        
-        print("Visualizations created successfully!")
         
+        charts = [
+            # 1. Top Products Visualization
+            bar_chart('category_revenue.png', top_products['Total Revenue (₹)'],
+                      'Category-wise Revenue Distribution', 'Product Category', 'Revenue (₹)'),
+            # 2. Revenue Trends Visualization
+            line_chart('revenue_trends.png', trends['revenue'],
+                       'Monthly Revenue Trends', 'Month', 'Revenue (₹)'),
+            # 3. Regional Performance
+            bar_chart('city_revenue.png', city_metrics['Total Revenue (₹)'],
+                      'City-wise Revenue Distribution', 'City', 'Revenue (₹)'),
+            # 4. Payment Methods Analysis
+            bar_chart('payment_methods.png', payment_data['Number of Orders'],
+                      'Payment Method Distribution', 'Payment Method', 'Number of Orders', figsize=(10, 6))
+        ]
+        
+        # Charts whose inputs are unchanged since the last run are not redrawn
+        redrawn = render_charts(charts, 'visualizations', workers=workers)
+        logger.info("Visualizations created successfully! %d of %d charts redrawn", len(redrawn), len(charts))
+        
+    @instrumented
     def generate_report(self):
         """Generate a comprehensive analysis report"""
-        if self.df is None:
+        if self.aggregates is None:
             return
             
-        # Basic metrics
-        total_orders = len(self.df)
-        total_revenue = self.df['total_price'].sum()
-        avg_order_value = self.df['total_price'].mean()
-        
-        # Customer metrics
-        total_customers = self.df['customer_id'].nunique()
-        repeat_customers = self.df.groupby('customer_id').size()[lambda x: x > 1].count()
+        # Basic and customer metrics
+        overview = self.aggregates.overview()
         
         # Product metrics
         product_analysis = self.analyze_top_products()
@@ -213,21 +385,27 @@ class EcommerceAnalyzer:
         
         report = {
             'overview': {
-                'total_orders': total_orders,
-                'total_revenue': f"₹{total_revenue:,.2f}",
-                'average_order_value': f"₹{avg_order_value:,.2f}",
-                'total_customers': total_customers,
-                'repeat_customers': repeat_customers
+                'total_orders': overview['total_orders'],
+                'total_revenue': f"₹{overview['total_revenue']:,.2f}",
+                'average_order_value': f"₹{overview['average_order_value']:,.2f}",
+                'total_customers': overview['total_customers'],
+                'repeat_customers': overview['repeat_customers']
             },
             'product_analysis': product_analysis.to_dict(),
             'regional_analysis': regional_analysis.to_dict(),
             'payment_analysis': payment_analysis.to_dict(),
             'customer_behavior': customer_behavior
         }
+
+        # Percentiles, heavy hitters and error bounds of the approximate figures
+        if self.aggregates.customers is None and self.aggregates.sketches is not None:
+            report['approximation'] = self.aggregates.sketches.summary()
         
         return report
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     # Generate sample data first
     import generate_sample_data
     generate_sample_data.generate_sample_data()
@@ -0,0 +1,126 @@
+import queue
+import threading
+
+import pandas as pd
+from openpyxl import Workbook
+
+# Excel's limit on rows per worksheet, header row included
+EXCEL_MAX_ROWS = 1_048_576
+BATCH_ROWS = 10_000
+# Row batches queued ahead of the writer thread; bounds the rows held in memory
+MAX_PENDING_BATCHES = 8
+
+_DONE = object()
+_ABORT = object()
+
+def frame_header(df, index=True):
+    """Header row as DataFrame.to_excel would write it"""
+    names = [str(column) for column in df.columns]
+    return ([df.index.name or ''] if index else []) + names
+
+def frame_batches(df, batch_rows=BATCH_ROWS, index=True):
+    """Yield the rows of df as lists of plain Python values, batch_rows at a time"""
+    for start in range(0, len(df), batch_rows):
+        chunk = df.iloc[start:start + batch_rows]
+        if index:
+            chunk = chunk.reset_index()
+        columns = {}
+        for position, (_, column) in enumerate(chunk.items()):
+            if isinstance(column.dtype, pd.PeriodDtype):
+                column = column.astype(str)
+            # Missing values become empty cells, numpy scalars become Python numbers
+            columns[position] = column.astype(object).where(column.notna(), None)
+        yield pd.DataFrame(columns).values.tolist()
+
+class StreamingWorkbook:
+    """Write-only xlsx workbook whose rows are written by a background thread.
+
+    Sheets are queued as batches of rows, so the caller computes the next
+    sheet while earlier ones are being written, and no more than
+    max_pending batches wait in memory. A sheet longer than Excel's row
+    limit continues on sheets named 'Name (2)', 'Name (3)' and so on, each
+    starting with the header row. Use it as a context manager: the
+    workbook is saved on a clean exit and discarded if the block fails.
+    """
+
+    def __init__(self, path, max_pending=MAX_PENDING_BATCHES):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._write, name='excel-writer', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._queue.put(_ABORT)
+            self._thread.join()
+
+    def add_frame(self, name, df, index=True):
+        """Queue a DataFrame as one sheet (continued on extra sheets past the row limit)"""
+        self.add_frames(name, [df], index=index)
+
+    def add_frames(self, name, frames, index=True):
+        """Queue consecutive DataFrames with the same columns as one sheet.
+
+        frames may be a generator, so a large sheet is produced and written
+        piece by piece.
+        """
+        started = False
+        for frame in frames:
+            if not started:
+                self._put(('sheet', name, frame_header(frame, index)))
+                started = True
+            for batch in frame_batches(frame, index=index):
+                self._put(('rows', batch))
+
+    def close(self):
+        """Wait for the queued rows to be written and save the workbook"""
+        self._queue.put(_DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, item):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(item)
+
+    def _write(self):
+        item = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _ABORT:
+                    return
+                if item is _DONE:
+                    break
+                if item[0] == 'sheet':
+                    _, name, header = item
+                    part = 1
+                    sheet = self._new_sheet(name, part, header)
+                    rows = 1
+                    continue
+                for row in item[1]:
+                    if rows == EXCEL_MAX_ROWS:
+                        part += 1
+                        sheet = self._new_sheet(name, part, header)
+                        rows = 1
+                    sheet.append(row)
+                    rows += 1
+            self.workbook.save(self.path)
+        except Exception as e:
+            self._error = e
+            # Keep consuming so the producer never blocks on a full queue
+            while item is not _DONE and item is not _ABORT:
+                item = self._queue.get()
+
+    def _new_sheet(self, name, part, header):
+        sheet = self.workbook.create_sheet(name if part == 1 else f"{name} ({part})")
+        sheet.append(header)
+        return sheet
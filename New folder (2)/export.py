@@ -0,0 +1,76 @@
+import gzip
+import os
+import tempfile
+
+# Rows converted and written at a time; bounds the memory used by an export
+EXPORT_CHUNK_ROWS = 50_000
+
+# Format name -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet')
+}
+
+def format_for_path(path):
+    """Export format implied by a file name, defaulting to CSV"""
+    for fmt, (extension, _) in EXPORT_FORMATS.items():
+        if path.endswith(extension) and extension != '.csv':
+            return fmt
+    return 'csv'
+
+def iter_chunks(df, mask=None, columns=None, chunk_rows=EXPORT_CHUNK_ROWS, transform=None):
+    """Yield df in row chunks, keeping masked rows and the selected columns.
+
+    transform (e.g. EcommerceAnalyzer.decode_ids) is applied to one chunk at
+    a time, so no full-size copy of df is ever made.
+    """
+    columns = list(columns) if columns else list(df.columns)
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if mask is not None:
+            chunk = chunk[mask[start:start + chunk_rows]]
+        if len(chunk) == 0:
+            continue
+        chunk = chunk[columns]
+        yield transform(chunk) if transform is not None else chunk
+
+def write_chunks(chunks, path, fmt='csv'):
+    """Write DataFrame chunks to path as CSV, gzipped CSV or Parquet and return the row count"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    rows = 0
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    opener = gzip.open if fmt == 'csv.gz' else open
+    with opener(path, 'wt', newline='') as f:
+        for chunk in chunks:
+            chunk.to_csv(f, header=rows == 0, index=False)
+            rows += len(chunk)
+    return rows
+
+def export_to_tempfile(chunks, fmt='csv', prefix='ecommerce_export_'):
+    """Write chunks to a new temporary file and return its path; the caller removes it"""
+    extension, _ = EXPORT_FORMATS[fmt]
+    handle, path = tempfile.mkstemp(suffix=extension, prefix=prefix)
+    os.close(handle)
+    try:
+        write_chunks(chunks, path, fmt)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
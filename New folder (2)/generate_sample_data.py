@@ -1,88 +1,131 @@
+import argparse
+import os
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
-
-def generate_sample_data(num_records=1000):
-    # Generate random dates
-    start_date = datetime(2023, 1, 1)
-    end_date = datetime(2023, 12, 31)
-    date_range = (end_date - start_date).days
-    
-    # Sample product categories based on popular Flipkart categories
-    categories = [
-        'Mobile Phones',
-        'Fashion',
-        'Electronics',
-        'Home & Kitchen',
-        'Grocery & Staples',
-        'Beauty & Personal Care',
-        'Books & Stationery',
-        'Sports & Fitness',
-        'Furniture',
-        'Appliances'
-    ]
-    
-    # Sample cities for delivery
-    cities = [
-        'Mumbai', 'Delhi', 'Bangalore', 'Hyderabad', 'Chennai',
-        'Kolkata', 'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow'
-    ]
-    
-    # Price ranges for different categories (in INR)
-    category_price_ranges = {
-        'Mobile Phones': (8000, 50000),
-        'Fashion': (500, 5000),
-        'Electronics': (1000, 80000),
-        'Home & Kitchen': (500, 15000),
-        'Grocery & Staples': (200, 3000),
-        'Beauty & Personal Care': (100, 2000),
-        'Books & Stationery': (200, 1500),
-        'Sports & Fitness': (500, 10000),
-        'Furniture': (2000, 50000),
-        'Appliances': (5000, 80000)
-    }
-    
-    # Generate sample data
-    data = []
-    for i in range(1, num_records + 1):
-        # Select random category
-        category = random.choice(categories)
-        # Get price range for category
-        min_price, max_price = category_price_ranges[category]
-        
-        # Generate order
-        order = {
-            'order_id': f'OD{i:06d}',
-            'customer_id': f'CUST{random.randint(1, num_records//2):04d}',  # Creating repeat customers
-            'customer_name': f'Customer {random.randint(1, num_records//2)}',
-            'product_name': category,
-            'quantity': np.random.randint(1, 5),
-            'city': random.choice(cities),
-            'payment_method': random.choice(['UPI', 'Credit Card', 'Debit Card', 'COD', 'Net Banking']),
-            'order_date': start_date + timedelta(days=random.randint(0, date_range))
-        }
-        
-        # Calculate total price based on category and quantity
-        base_price = round(np.random.uniform(min_price, max_price), -1)  # Round to nearest 10
-        order['total_price'] = base_price * order['quantity']
-        
-        # Add festival season discounts (October-November)
-        order_month = order['order_date'].month
-        if order_month in [10, 11]:  # Diwali season
-            order['total_price'] = order['total_price'] * 0.8  # 20% discount
-        
-        data.append(order)
-    
-    # Create DataFrame
-    df = pd.DataFrame(data)
-    
-    # Sort by date
-    df = df.sort_values('order_date')
-    
-    # Save to CSV
-    df.to_csv('data/ecommerce_data.csv', index=False)
-    print(f"Generated {num_records} sample records in data/ecommerce_data.csv")
+from datetime import datetime
+
+from export import format_for_path, write_chunks
+from storage import is_order_store, write_order_store
+
+# Sample product categories based on popular Flipkart categories
+CATEGORIES = [
+    'Mobile Phones',
+    'Fashion',
+    'Electronics',
+    'Home & Kitchen',
+    'Grocery & Staples',
+    'Beauty & Personal Care',
+    'Books & Stationery',
+    'Sports & Fitness',
+    'Furniture',
+    'Appliances'
+]
+
+# Sample cities for delivery
+CITIES = [
+    'Mumbai', 'Delhi', 'Bangalore', 'Hyderabad', 'Chennai',
+    'Kolkata', 'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow'
+]
+
+PAYMENT_METHODS = ['UPI', 'Credit Card', 'Debit Card', 'COD', 'Net Banking']
+
+# Price ranges for different categories (in INR)
+CATEGORY_PRICE_RANGES = {
+    'Mobile Phones': (8000, 50000),
+    'Fashion': (500, 5000),
+    'Electronics': (1000, 80000),
+    'Home & Kitchen': (500, 15000),
+    'Grocery & Staples': (200, 3000),
+    'Beauty & Personal Care': (100, 2000),
+    'Books & Stationery': (200, 1500),
+    'Sports & Fitness': (500, 10000),
+    'Furniture': (2000, 50000),
+    'Appliances': (5000, 80000)
+}
+
+START_DATE = datetime(2023, 1, 1)
+END_DATE = datetime(2023, 12, 31)
+
+# Diwali season months with a 20% discount
+FESTIVAL_MONTHS = [10, 11]
+FESTIVAL_DISCOUNT = 0.8
+
+def _generate_chunk(rng, first_id, days, num_customers):
+    """Build the orders for one chunk; days holds each row's offset from START_DATE"""
+    size = len(days)
+    category = rng.integers(0, len(CATEGORIES), size)
+    quantity = rng.integers(1, 5, size)
+
+    # Calculate total price based on category and quantity
+    min_price = np.array([CATEGORY_PRICE_RANGES[c][0] for c in CATEGORIES])[category]
+    max_price = np.array([CATEGORY_PRICE_RANGES[c][1] for c in CATEGORIES])[category]
+    base_price = np.round(rng.uniform(min_price, max_price), -1)  # Round to nearest 10
+    total_price = base_price * quantity
+
+    order_date = np.datetime64(START_DATE.date()) + days.astype('timedelta64[D]')
+    # Add festival season discounts (October-November)
+    month = order_date.astype('datetime64[M]').astype(int) % 12 + 1
+    total_price = np.where(np.isin(month, FESTIVAL_MONTHS), total_price * FESTIVAL_DISCOUNT, total_price)
+
+    order_ids = pd.Series(np.arange(first_id, first_id + size)).astype(str)
+    customer_ids = pd.Series(rng.integers(1, num_customers + 1, size)).astype(str)  # Creating repeat customers
+    customer_names = pd.Series(rng.integers(1, num_customers + 1, size)).astype(str)
+    return pd.DataFrame({
+        'order_id': 'OD' + order_ids.str.zfill(6),
+        'customer_id': 'CUST' + customer_ids.str.zfill(4),
+        'customer_name': 'Customer ' + customer_names,
+        'product_name': pd.Categorical.from_codes(category, CATEGORIES),
+        'quantity': quantity,
+        'city': pd.Categorical.from_codes(rng.integers(0, len(CITIES), size), CITIES),
+        'payment_method': pd.Categorical.from_codes(rng.integers(0, len(PAYMENT_METHODS), size), PAYMENT_METHODS),
+        'order_date': order_date,
+        'total_price': total_price
+    })
+
+def iter_sample_chunks(num_records, seed=None, chunk_rows=500_000):
+    """Yield the sample orders in date order, chunk_rows at a time.
+
+    Rows are spread uniformly over the days of 2023 up front (one count per
+    day), so chunks come out already sorted by date without holding the
+    whole dataset in memory.
+    """
+    rng = np.random.default_rng(seed)
+    num_days = (END_DATE - START_DATE).days + 1
+    num_customers = max(num_records // 2, 1)
+    day_ends = np.cumsum(rng.multinomial(num_records, [1 / num_days] * num_days))
+
+    for start in range(0, num_records, chunk_rows):
+        rows = np.arange(start, min(start + chunk_rows, num_records))
+        days = np.searchsorted(day_ends, rows, side='right')
+        yield _generate_chunk(rng, start + 1, days, num_customers)
+
+def generate_sample_data(num_records=1000, scale=1, seed=None, output_path='data/ecommerce_data.csv',
+                         chunk_rows=500_000):
+    """Generate synthetic orders and write them to CSV, gzipped CSV (.csv.gz), Parquet
+    (.parquet) or a month-partitioned order store (.orders, see storage.py).
+
+    scale multiplies num_records, so scale=10_000 on the default gives ten
+    million orders. Output is written chunk by chunk with bounded memory, and
+    the same seed and chunk_rows always produce the same file.
+    """
+    num_records = int(num_records * scale)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    chunks = iter_sample_chunks(num_records, seed=seed, chunk_rows=chunk_rows)
+
+    if is_order_store(output_path):
+        write_order_store(chunks, output_path)
+    else:
+        write_chunks(chunks, output_path, format_for_path(output_path))
+
+    print(f"Generated {num_records} sample records in {output_path}")
 
 if __name__ == "__main__":
-    generate_sample_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate synthetic e-commerce orders")
+    parser.add_argument('--records', type=int, default=1000, help="base number of orders")
+    parser.add_argument('--scale', type=float, default=1, help="multiplier applied to --records")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for reproducible output")
+    parser.add_argument('--output', default='data/ecommerce_data.csv', help="CSV, .csv.gz, .parquet or .orders output path")
+    parser.add_argument('--chunk-rows', type=int, default=500_000, help="rows generated per chunk")
+    args = parser.parse_args()
+    generate_sample_data(args.records, scale=args.scale, seed=args.seed,
+                         output_path=args.output, chunk_rows=args.chunk_rows)
@@ -0,0 +1,156 @@
+import hashlib
+import io
+import logging
+import os
+import pickle
+
+import pandas as pd
+
+from aggregation import OrderAggregates, align_customer_keys
+from order_data import read_orders, compact_columns, parse_order_date
+
+logger = logging.getLogger(__name__)
+
+# Bump when the persisted state layout changes so old state files are rebuilt
+STATE_VERSION = 7
+# Bytes just before the consumed offset that are re-hashed to detect a rewritten file
+CHECK_BYTES = 64 * 1024
+# New data is parsed in line-aligned blocks of about this size
+BLOCK_BYTES = 64 * 1024 * 1024
+
+class IncrementalAggregator:
+    """Persisted OrderAggregates for an order file that only grows.
+
+    The state remembers how many bytes of the file have been folded in, so
+    refresh() parses only the rows appended since the last run. A file that
+    was rewritten rather than appended to (different header, shorter, or
+    changed just before the old offset) is folded again from the start.
+    append() takes new rows as a DataFrame instead and keeps only those
+    newer than the order_date watermark. Use one or the other for a given
+    state file, not both.
+    """
+
+    def __init__(self, data_path, state_path=None):
+        self.data_path = data_path
+        self.state_path = state_path or f"{data_path}.state.pkl"
+        self.state = self._load_state()
+        # Bytes of order rows parsed by the last refresh()
+        self.bytes_read = 0
+
+    @property
+    def aggregates(self):
+        return self.state['aggregates']
+
+    def refresh(self):
+        """Fold the rows appended to the file since the last refresh and persist the state"""
+        size = os.path.getsize(self.data_path)
+        if self.state is None or not self._matches_file(size):
+            self.state = self._empty_state()
+
+        start = self.state['offset']
+        self.bytes_read = 0
+        if size > start:
+            rows_before = self.state['rows']
+            self.state['offset'] = self._fold_file(start, size)
+            self.state['check_hash'] = self._check_hash(self.state['offset'])
+            self.bytes_read = self.state['offset'] - start
+            logger.info("Folded %s new rows (%.2f MB) into %s", f"{self.state['rows'] - rows_before:,}",
+                        self.bytes_read / 1024 ** 2, self.state_path)
+            self._save_state()
+        return self.aggregates
+
+    def append(self, df):
+        """Fold order rows newer than the order_date watermark and persist the state"""
+        if self.state is None:
+            self.state = self._empty_state()
+        df = df.copy()
+        if not pd.api.types.is_datetime64_any_dtype(df['order_date']):
+            df['order_date'] = pd.to_datetime(df['order_date'])
+        if self.state['watermark'] is not None:
+            df = df[df['order_date'] > self.state['watermark']]
+        if len(df):
+            self._fold_frame(df)
+            self._save_state()
+        return self.aggregates
+
+    def _fold_file(self, start, end):
+        """Fold the complete lines in [start, end) and return the offset after the last one"""
+        header = self.state['header']
+        with open(self.data_path, 'rb') as f:
+            f.seek(start)
+            position = start
+            while position < end:
+                block = f.read(min(BLOCK_BYTES, end - position))
+                # Only whole lines are folded; a partly written last line waits for the next refresh
+                cut = block.rfind(b'\n') + 1
+                if cut == 0:
+                    break
+                self._fold_frame(read_orders(io.BytesIO(header + block[:cut])))
+                position += cut
+                f.seek(position)
+        return position
+
+    def _fold_frame(self, df):
+        encoded = compact_columns(df)
+        parse_order_date(df)
+        part = OrderAggregates.from_frame(df)
+
+        state = self.state
+        if state['aggregates'] is None:
+            state['aggregates'], state['encoded_ids'] = part, encoded
+        else:
+            aggregates, part, state['encoded_ids'] = align_customer_keys(
+                state['aggregates'], state['encoded_ids'], part, encoded
+            )
+            state['aggregates'] = aggregates.merge(part)
+
+        latest = df['order_date'].max()
+        if state['watermark'] is None or latest > state['watermark']:
+            state['watermark'] = latest
+        state['rows'] += len(df)
+
+    def _read_header(self):
+        with open(self.data_path, 'rb') as f:
+            return f.readline()
+
+    def _check_hash(self, offset):
+        """Hash the bytes just before offset, which must not change between refreshes"""
+        start = max(0, offset - CHECK_BYTES)
+        with open(self.data_path, 'rb') as f:
+            f.seek(start)
+            return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+    def _matches_file(self, size):
+        state = self.state
+        return (
+            state['version'] == STATE_VERSION
+            and size >= state['offset']
+            and self._read_header() == state['header']
+            and self._check_hash(state['offset']) == state['check_hash']
+        )
+
+    def _empty_state(self):
+        header = self._read_header()
+        return {
+            'version': STATE_VERSION,
+            'header': header,
+            'offset': len(header),
+            'check_hash': self._check_hash(len(header)),
+            'rows': 0,
+            'watermark': None,
+            'encoded_ids': {},
+            'aggregates': None
+        }
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def _save_state(self):
+        # Write to a temporary file first so a crash never leaves a truncated state
+        with open(f"{self.state_path}.tmp", 'wb') as f:
+            pickle.dump(self.state, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
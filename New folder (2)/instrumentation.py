@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Stage records are only built while at least one sink is registered
+_sinks = []
+_local = threading.local()
+
+def current_rss_mb():
+    """Resident memory of this process, or None where it cannot be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        return None
+
+def peak_rss_mb():
+    """Highest resident memory of this process so far, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+class LogSink:
+    """Write each stage as a key=value log line"""
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def emit(self, record):
+        fields = ' '.join(f"{key}={value}" for key, value in record.items()
+                          if key not in ('stage', 'timestamp'))
+        logger.log(self.level, "stage=%s %s", record['stage'], fields, extra={'stage_record': record})
+
+class JsonTraceSink:
+    """Append each stage as one JSON object per line to a trace file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def emit(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+class MemorySink:
+    """Keep the most recent stage records in memory, e.g. for a dashboard debug panel"""
+
+    def __init__(self, max_records=1000):
+        self.records = deque(maxlen=max_records)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records.clear()
+
+    def to_frame(self):
+        return pd.DataFrame(list(self.records))
+
+def add_sink(sink):
+    if sink not in _sinks:
+        _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+def clear_sinks():
+    del _sinks[:]
+
+def enabled():
+    return bool(_sinks)
+
+def configure_from_env():
+    """Register sinks named by ECOMMERCE_PROFILE: 'log' and/or paths of JSON trace files"""
+    for target in filter(None, os.environ.get('ECOMMERCE_PROFILE', '').split(',')):
+        add_sink(LogSink() if target.strip() == 'log' else JsonTraceSink(target.strip()))
+
+@contextmanager
+def stage(name, **fields):
+    """Time a block and emit its duration, memory delta and any fields set on the yielded record.
+
+    With no sinks registered nothing is measured and None is yielded.
+    """
+    if not _sinks:
+        yield None
+        return
+
+    depth = getattr(_local, 'depth', 0)
+    record = {'stage': name, 'depth': depth, **fields}
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    _local.depth = depth + 1
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        _local.depth = depth
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        rss_after = current_rss_mb()
+        if rss_before is not None and rss_after is not None:
+            record['rss_mb'] = round(rss_after, 1)
+            record['rss_delta_mb'] = round(rss_after - rss_before, 1)
+        record['timestamp'] = time.time()
+        for sink in list(_sinks):
+            try:
+                sink.emit(record)
+            except Exception as e:
+                logger.warning("Stage sink %r failed: %s", sink, e)
+
+def instrumented(func):
+    """Record an analyzer method as a stage named Class.method, with the analyzer's row count"""
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not _sinks:
+            return func(self, *args, **kwargs)
+        with stage(f"{type(self).__name__}.{func.__name__}") as record:
+            result = func(self, *args, **kwargs)
+            if record is not None:
+                record['rows'] = self.row_count()
+        return result
+    return wrapper
+
+configure_from_env()
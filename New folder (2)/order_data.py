@@ -0,0 +1,134 @@
+import calendar
+import re
+
+import numpy as np
+import pandas as pd
+
+# Read-time schema for the order data. Repeated text columns are stored as
+# categoricals, order_date is parsed while reading and the prefixed order and
+# customer IDs are reduced to integer codes once loaded.
+CATEGORICAL_COLUMNS = ['customer_name', 'product_id', 'product_name', 'city', 'payment_method']
+DATE_COLUMNS = ['order_date']
+ID_FORMATS = {
+    'order_id': ('OD', 6),
+    'customer_id': ('CUST', 4)
+}
+# Time dimensions derived from order_date, kept as small integer codes and
+# labelled only for presentation: month is the pandas Period ordinal (months
+# since 1970-01), day_of_week runs from 0 (Monday) to 6 and hour from 0 to 23
+TIME_CODE_DTYPES = {
+    'month': 'int16',
+    'day_of_week': 'int8',
+    'hour': 'int8'
+}
+DAYS_OF_WEEK = list(calendar.day_name)
+# Rows read with pandas' default types to estimate the footprint the typed schema saves
+BASELINE_SAMPLE_ROWS = 10_000
+
+def memory_usage_mb(df):
+    """Return the deep memory footprint of a DataFrame in megabytes"""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def untyped_memory_mb(data_path, rows, sample_rows=BASELINE_SAMPLE_ROWS):
+    """Estimate the footprint of `rows` orders read by pd.read_csv with its default types.
+
+    Only the first sample_rows rows are read untyped (text as Python
+    strings, dates unparsed); their size per row is scaled up to rows.
+    """
+    sample = pd.read_csv(data_path, nrows=sample_rows)
+    if not len(sample):
+        return 0.0
+    return memory_usage_mb(sample) / len(sample) * rows
+
+def encode_prefixed_ids(series, prefix, width):
+    """Convert IDs such as CUST0040 to integers, or return None if that is not lossless"""
+    if series.isna().any():
+        return None
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Index(uniques, dtype=object)
+    pattern = rf'{re.escape(prefix)}(?:\d{{{width}}}|[1-9]\d{{{width},}})'
+    if not uniques.str.fullmatch(pattern).all():
+        return None
+    numbers = uniques.str.slice(len(prefix)).astype('int64').to_numpy()
+    if numbers.max(initial=0) <= np.iinfo(np.int32).max:
+        numbers = numbers.astype(np.int32)
+    return pd.Series(numbers[codes], index=series.index, name=series.name)
+
+def decode_prefixed_ids(series, prefix, width):
+    """Format integer ID codes back into their original string form"""
+    return prefix + series.astype('int64').astype(str).str.zfill(width)
+
+def read_orders(data_path, dtype=None, **read_kwargs):
+    """Read the order CSV with the typed schema; extra arguments go to pd.read_csv"""
+    position = data_path.tell() if hasattr(data_path, 'seek') else None
+    columns = pd.read_csv(data_path, nrows=0).columns
+    if position is not None:
+        data_path.seek(position)
+    schema = {col: 'category' for col in CATEGORICAL_COLUMNS if col in columns}
+    schema.update(dtype or {})
+    return pd.read_csv(
+        data_path,
+        dtype=schema,
+        parse_dates=[col for col in DATE_COLUMNS if col in columns],
+        **read_kwargs
+    )
+
+def compact_columns(df):
+    """Encode prefixed IDs as integers and downcast numeric columns in place.
+
+    Returns the ID columns that were encoded, mapped to their (prefix, width).
+    """
+    encoded_ids = {}
+    for column, (prefix, width) in ID_FORMATS.items():
+        if column not in df.columns:
+            continue
+        encoded = encode_prefixed_ids(df[column], prefix, width)
+        if encoded is None:
+            df[column] = df[column].astype('category')
+        else:
+            df[column] = encoded
+            encoded_ids[column] = (prefix, width)
+
+    downcast_numeric(df)
+    return encoded_ids
+
+def downcast_numeric(df):
+    """Store quantity in the smallest integer type that holds it, in place"""
+    # total_price stays float64 so revenue totals are exact to the paisa
+    if 'quantity' in df.columns and not df['quantity'].isna().any():
+        df['quantity'] = pd.to_numeric(df['quantity'], downcast='integer')
+
+def parse_order_date(df):
+    """Parse order_date in place if it was not already parsed while reading"""
+    if not pd.api.types.is_datetime64_any_dtype(df['order_date']):
+        df['order_date'] = pd.to_datetime(df['order_date'])
+
+def time_codes(dates, column):
+    """Integer codes of a derived time column for a Series of dates.
+
+    Codes are computed from the dates on request rather than stored on the
+    frame. They are nullable only when some dates are missing.
+    """
+    values = dates.to_numpy(dtype='datetime64[ns]')
+    if column == 'month':
+        codes = values.astype('datetime64[M]').astype(np.int64)
+    elif column == 'day_of_week':
+        # 1970-01-01 was a Thursday
+        codes = (values.astype('datetime64[D]').astype(np.int64) + 3) % 7
+    else:
+        codes = values.astype('datetime64[h]').astype(np.int64) % 24
+    missing = np.isnat(values)
+    return as_time_codes(pd.Series(np.where(missing, 0, codes), index=dates.index, name=column).mask(missing), column)
+
+def as_time_codes(series, column):
+    """Cast a Series of codes to the compact dtype of a derived time column"""
+    dtype = TIME_CODE_DTYPES[column]
+    return series.astype(dtype.capitalize() if series.isna().any() else dtype)
+
+def month_labels(codes):
+    """Monthly periods for month codes, for presentation"""
+    return pd.PeriodIndex.from_ordinals(np.asarray(codes, dtype=np.int64), freq='M', name='month')
+
+def day_labels(codes):
+    """Day names for day_of_week codes, for presentation"""
+    return pd.Index(np.asarray(DAYS_OF_WEEK)[np.asarray(codes, dtype=np.int64)], name='day_of_week')
\ No newline at end of file
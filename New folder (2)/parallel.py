@@ -0,0 +1,52 @@
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from aggregation import OrderAggregates
+from sketches import hash_values
+
+# Below this many rows the cost of starting workers outweighs the speedup
+PARALLEL_MIN_ROWS = 100_000
+
+def partition_by_customer(df, partitions):
+    """Split the orders so that each customer's rows land in exactly one partition"""
+    keys = hash_values(df['customer_id']) % np.uint64(partitions)
+    return _split_by_key(df, keys, partitions)
+
+def partition_by_date(df, partitions):
+    """Split the orders into contiguous order_date ranges of similar size"""
+    positions = np.argsort(df['order_date'].to_numpy(), kind='stable')
+    keys = np.empty(len(df), dtype=np.int64)
+    keys[positions] = np.arange(len(df)) * partitions // max(len(df), 1)
+    return _split_by_key(df, keys, partitions)
+
+def _split_by_key(df, keys, partitions):
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(1, partitions))
+    return [df.take(rows) for rows in np.split(order, bounds) if len(rows)]
+
+PARTITIONERS = {
+    'customer': partition_by_customer,
+    'date': partition_by_date
+}
+
+def parallel_aggregates(df, workers=None, partition_by='customer', partitions=None, sketches=False,
+                        customers=True):
+    """Compute OrderAggregates over partitions of df in a process pool.
+
+    Every measure is additive, so merging the partial results gives exactly
+    the aggregates of the whole frame, per-customer metrics included. With
+    customer partitioning each customer's tallies come from a single worker.
+    With sketches=True every worker also sketches its rows (see OrderSketches),
+    and with customers=False the workers build no per-customer tables.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(df) < PARALLEL_MIN_ROWS:
+        return OrderAggregates.from_frame(df, sketches, customers)
+
+    parts = PARTITIONERS[partition_by](df, partitions or workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(partial(OrderAggregates.from_frame, sketches=sketches, customers=customers), parts))
+    return OrderAggregates.combine(results)
@@ -0,0 +1,358 @@
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_cache
+from aggregation import CUBE_DIMENSIONS, TIME_CUBE_DIMENSIONS, OrderAggregates
+from instrumentation import stage
+from timeseries import RevenueSeries
+
+# Dashboard filter name -> order column it selects on
+FILTER_COLUMNS = {
+    'cities': 'city',
+    'categories': 'product_name',
+    'payment_methods': 'payment_method'
+}
+
+# Metrics answered by the query layer, each a rollup of OrderAggregates
+METRICS = {
+    'overview': OrderAggregates.overview,
+    'top_products': OrderAggregates.top_products,
+    'revenue_trends': OrderAggregates.revenue_trends,
+    'regional_performance': OrderAggregates.regional_performance,
+    'payment_methods': OrderAggregates.payment_methods,
+    'peak_periods': OrderAggregates.peak_periods,
+    'customer_behavior': lambda aggregates: (
+        aggregates.customer_behavior() if aggregates.has_customers else None
+    ),
+    'customer_segments': lambda aggregates: (
+        aggregates.customer_segments() if aggregates.customers is not None else None
+    )
+}
+# Metrics read from the orders in date order rather than the cube, each an OrderQuery method
+ROW_METRICS = ('revenue_series',)
+# Threads computing metrics submitted with OrderQuery.submit
+QUERY_WORKERS = 4
+
+# Metrics that only roll up a cube, mapped to that cube's dimensions; filters on
+# those dimensions never touch the rows
+CUBE_METRICS = {
+    'top_products': CUBE_DIMENSIONS,
+    'revenue_trends': CUBE_DIMENSIONS,
+    'regional_performance': CUBE_DIMENSIONS,
+    'payment_methods': CUBE_DIMENSIONS,
+    'peak_periods': TIME_CUBE_DIMENSIONS
+}
+
+class OrderIndex:
+    """Row indexes over the cleaned orders used to slice them without a full scan.
+
+    order_date is kept as row positions sorted by date, so a date range is
+    two binary searches. Each value of the filter columns has a boolean row
+    bitmap, so a selection is an OR of bitmaps within a column and an AND
+    across columns.
+    """
+
+    def __init__(self, df):
+        self.rows = len(df)
+        dates = df['order_date'].to_numpy()
+        self.date_order = np.argsort(dates, kind='stable')
+        self.sorted_dates = dates[self.date_order]
+        # NaT sorts last; rows without a date never fall inside a date range
+        self.dated_rows = int((~np.isnat(self.sorted_dates)).sum())
+        self.bitmaps = {}
+        for column in FILTER_COLUMNS.values():
+            if column in df.columns:
+                codes, values = pd.factorize(df[column])
+                self.bitmaps[column] = {value: codes == code for code, value in enumerate(values)}
+
+    @property
+    def date_range(self):
+        """First and last order date, or (None, None) without dated rows"""
+        if not self.dated_rows:
+            return None, None
+        return pd.Timestamp(self.sorted_dates[0]), pd.Timestamp(self.sorted_dates[self.dated_rows - 1])
+
+    def values(self, column):
+        """Sorted distinct values of an indexed column"""
+        return sorted(self.bitmaps.get(column, {}))
+
+    def mask(self, start=None, end=None, **selections):
+        """Boolean mask of the rows matching the filters, or None when nothing is filtered"""
+        mask = None
+        if start is not None or end is not None:
+            low = 0 if start is None else np.searchsorted(
+                self.sorted_dates[:self.dated_rows], np.datetime64(start), side='left')
+            # end is a whole day, so every order placed on it is included
+            high = self.dated_rows if end is None else np.searchsorted(
+                self.sorted_dates[:self.dated_rows], np.datetime64(end + pd.Timedelta(days=1)), side='left')
+            mask = np.zeros(self.rows, dtype=bool)
+            mask[self.date_order[low:high]] = True
+
+        for name, selected in selections.items():
+            if not selected:
+                continue
+            bitmaps = self.bitmaps[FILTER_COLUMNS[name]]
+            column_mask = np.zeros(self.rows, dtype=bool)
+            for value in selected:
+                if value in bitmaps:
+                    column_mask |= bitmaps[value]
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+class OrderQuery:
+    """Filtered, memoized analyses over an EcommerceAnalyzer's orders.
+
+    Results are kept in an LRU cache keyed on (metric, filters, data
+    version), so repeated dashboard interactions are dictionary lookups.
+    Cube metrics filtered by city, category, payment method or whole months
+    are sliced from the analyzer's cube; peak periods come from the
+    time-of-sale cube, which only whole-month filters can slice. Other filter sets are scanned once
+    into OrderAggregates, which every metric for that filter set then rolls
+    up. Without filters the analyzer's own aggregates are used. Cached
+    results are shared between callers and must not be modified.
+
+    Metrics can also be computed in a background thread pool (submit,
+    prewarm). An entry requested again while it is being computed waits
+    for that computation instead of starting another.
+    """
+
+    def __init__(self, analyzer, max_entries=256, workers=QUERY_WORKERS):
+        self.max_entries = max_entries
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        # (analyzer, index, version) of the current data, only ever replaced whole under _lock
+        self._data = self._build(analyzer, self._file_version(analyzer))
+
+    @property
+    def analyzer(self):
+        return self._current()[0]
+
+    @property
+    def index(self):
+        return self._current()[1]
+
+    @property
+    def version(self):
+        return self._current()[2]
+
+    def _current(self):
+        with self._lock:
+            return self._data
+
+    def _build(self, analyzer, version):
+        with stage('OrderQuery.build_index', rows=analyzer.row_count()):
+            analyzer.clean_data()
+            return analyzer, OrderIndex(analyzer.df), version
+
+    def _file_version(self, analyzer):
+        fingerprint = data_cache.source_fingerprint(analyzer.data_path, with_hash=False)
+        return fingerprint['size'], fingerprint['mtime_ns']
+
+    def refresh(self, prewarm=False):
+        """Reload the orders and rebuild the indexes if the order file has changed.
+
+        The new data is loaded into a copy of the analyzer and indexed while
+        queries keep reading the current data; then analyzer, index and
+        version are swapped in together. Every query works on the data it
+        started with, so its result is cached under that data's version.
+        Entries for the old version stop matching and age out of the cache.
+        With prewarm=True the unfiltered metrics of the new version start
+        computing in the background right away.
+        """
+        current, _, version = self._current()
+        new_version = self._file_version(current)
+        if new_version == version:
+            return False
+        # The copy shares nothing that load_data does not replace, so readers of current are unaffected
+        analyzer = copy.copy(current)
+        analyzer.load_data()
+        data = self._build(analyzer, new_version)
+        with self._lock:
+            if self._data[2] != version:
+                # Another caller refreshed first; keep its data
+                return False
+            self._data = data
+        if prewarm:
+            self.prewarm()
+        return True
+
+    def options(self, column):
+        """Values offered for a filter column"""
+        return self.index.values(column)
+
+    def filter_key(self, start=None, end=None, **selections):
+        """Normalize filters into a hashable key; filters that select everything are dropped"""
+        return self._filter_key(self._current(), start, end, **selections)
+
+    def _filter_key(self, data, start=None, end=None, **selections):
+        unknown = set(selections) - set(FILTER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        first, last = data[1].date_range
+        start = pd.Timestamp(start).normalize() if start is not None else None
+        end = pd.Timestamp(end).normalize() if end is not None else None
+        if start is not None and first is not None and start <= first.normalize():
+            start = None
+        if end is not None and last is not None and end >= last.normalize():
+            end = None
+        selected = tuple(
+            (name, tuple(sorted(values)))
+            for name, values in sorted(selections.items()) if values
+        )
+        return start, end, selected
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            pending = self._pending.get(key)
+            computing = pending is None
+            if computing:
+                pending = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not computing:
+            # Another thread is already computing this entry; share its result
+            return pending.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            del self._pending[key]
+        pending.set_result(value)
+        return value
+
+    def cube_selections(self, key):
+        """Cube dimension values equivalent to a filter key, or None if days must be resolved"""
+        return self._cube_selections(self._current(), key)
+
+    def _cube_selections(self, data, key):
+        start, end, selected = key
+        selections = {FILTER_COLUMNS[name]: list(values) for name, values in selected}
+        if start is not None or end is not None:
+            # Only date ranges made of whole months line up with the cube's month cells
+            if start is not None and start != start.to_period('M').start_time:
+                return None
+            if end is not None and end != end.to_period('M').end_time.normalize():
+                return None
+            first, last = data[1].date_range
+            # The cube keys months by their Period ordinal (see order_data.time_codes)
+            selections['month'] = list(pd.period_range(
+                (start if start is not None else first).to_period('M'),
+                (end if end is not None else last).to_period('M'),
+                freq='M'
+            ).asi8)
+        return selections
+
+    def mask(self, **filters):
+        """Boolean row mask of the orders matching the filters, or None when nothing is filtered"""
+        data = self._current()
+        start, end, selected = self._filter_key(data, **filters)
+        return data[1].mask(start, end, **dict(selected))
+
+    def filtered_frame(self, **filters):
+        """The cleaned orders matching the filters"""
+        data = self._current()
+        return self._filtered_frame(data, self._filter_key(data, **filters))
+
+    def _filtered_frame(self, data, key):
+        analyzer, index, _ = data
+        start, end, selected = key
+        mask = index.mask(start, end, **dict(selected))
+        return analyzer.df if mask is None else analyzer.df[mask]
+
+    def aggregates(self, **filters):
+        """OrderAggregates of the orders matching the filters"""
+        data = self._current()
+        return self._aggregates(data, self._filter_key(data, **filters))
+
+    def _aggregates(self, data, key):
+        analyzer, _, version = data
+        start, end, selected = key
+        if start is None and end is None and not selected:
+            # Cached too, so concurrent first requests compute the aggregates once
+            return self._cached(('aggregates', key, version), analyzer.compute_aggregates)
+
+        def compute():
+            with stage('OrderQuery.aggregates') as record:
+                df = self._filtered_frame(data, key)
+                if record is not None:
+                    record['rows'] = len(df)
+                return OrderAggregates.from_frame(df)
+        return self._cached(('aggregates', key, version), compute)
+
+    def revenue_series(self, **filters):
+        """RevenueSeries of the orders matching the filters.
+
+        The rows are taken in the index's date order, so no sort is needed.
+        """
+        data = self._current()
+        analyzer, index, version = data
+        key = self._filter_key(data, **filters)
+        start, end, selected = key
+
+        def compute():
+            with stage('OrderQuery.revenue_series') as record:
+                positions = index.date_order[:index.dated_rows]
+                dates = index.sorted_dates[:index.dated_rows]
+                mask = index.mask(start, end, **dict(selected))
+                if mask is not None:
+                    keep = mask[positions]
+                    positions, dates = positions[keep], dates[keep]
+                if record is not None:
+                    record['rows'] = len(positions)
+                revenue = analyzer.df['total_price'].to_numpy(dtype=np.float64, na_value=np.nan)
+                return RevenueSeries(dates, revenue[positions])
+        return self._cached(('revenue_series', key, version), compute)
+
+    def run(self, metric, **filters):
+        """Compute or fetch a metric (see METRICS and ROW_METRICS) for the orders matching the filters"""
+        if metric in ROW_METRICS:
+            return getattr(self, metric)(**filters)
+        data = self._current()
+        filter_key = self._filter_key(data, **filters)
+
+        def compute():
+            selections = self._cube_selections(data, filter_key) if metric in CUBE_METRICS else None
+            if selections and set(selections) <= set(CUBE_METRICS[metric]):
+                unfiltered = self._aggregates(data, (None, None, ()))
+                return METRICS[metric](unfiltered.where(**selections))
+            return METRICS[metric](self._aggregates(data, filter_key))
+        return self._cached((metric, filter_key, data[2]), compute)
+
+    def submit(self, metric, **filters):
+        """Start computing a metric in the thread pool and return a Future of its result"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='order-query')
+        return self._executor.submit(self.run, metric, **filters)
+
+    def prewarm(self, metrics=None):
+        """Start computing metrics (default all) for the unfiltered orders; returns their Futures"""
+        return {metric: self.submit(metric) for metric in (metrics or [*METRICS, *ROW_METRICS])}
+
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache),
+                'max_entries': self.max_entries}
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# Per-customer features scored and clustered, in R, F, M order
+RFM_FEATURES = ['recency_days', 'frequency', 'monetary']
+# Quantile levels of the R, F and M scores; 5 is the best
+SCORE_LEVELS = 5
+DEFAULT_SEGMENTS = 4
+# Customers per k-means step; a step costs the same however many customers there are
+BATCH_SIZE = 4096
+# Segment names from the best to the worst cluster, used when there are DEFAULT_SEGMENTS of them
+SEGMENT_NAMES = ['Champions', 'Loyal', 'Needs Attention', 'Hibernating']
+
+def rfm_table(customers, as_of=None):
+    """Recency, frequency and monetary value of every customer in an OrderAggregates customer table.
+
+    Recency is the number of days from the customer's last order to as_of,
+    by default the day after the latest order. Customers without a dated
+    order count as the least recent.
+    """
+    if 'last_order' not in customers.columns:
+        raise ValueError("customer segmentation needs the last order date of every customer")
+    last_order = customers['last_order']
+    if as_of is None:
+        as_of = last_order.max().normalize() + pd.Timedelta(days=1)
+    recency = (pd.Timestamp(as_of) - last_order) / pd.Timedelta(days=1)
+    return pd.DataFrame({
+        'recency_days': recency.fillna(recency.max()).fillna(0).to_numpy(),
+        'frequency': customers['purchases'].to_numpy(),
+        'monetary': customers['revenue'].to_numpy()
+    }, index=customers.index)
+
+def rfm_scores(rfm, levels=SCORE_LEVELS):
+    """Quantile score from 1 to levels of each RFM feature, higher for recent, frequent, high-value customers.
+
+    The quantile edges come from a linear-time selection rather than a
+    sort, and customers with equal values always get the same score.
+    """
+    quantiles = np.linspace(0, 1, levels + 1)[1:-1]
+    scores = {}
+    for name, column in zip('RFM', RFM_FEATURES):
+        values = rfm[column].to_numpy(dtype=np.float64)
+        edges = np.quantile(values, quantiles) if len(values) else quantiles
+        # Number of edges strictly below each value
+        below = np.searchsorted(edges, values, side='left')
+        score = levels - below if column == 'recency_days' else below + 1
+        scores[name] = score.astype(np.int8)
+    return pd.DataFrame(scores, index=rfm.index)
+
+def segment_customers(rfm, n_segments=DEFAULT_SEGMENTS, batch_size=BATCH_SIZE, random_state=0):
+    """Cluster customers on their log-scaled, standardized RFM features with mini-batch k-means.
+
+    Returns each customer's segment number, 0 for the cluster with the
+    best recency, frequency and spend.
+    """
+    # Only clustering needs scikit-learn, and importing it is slow
+    from sklearn.cluster import MiniBatchKMeans
+
+    n_clusters = min(n_segments, len(rfm))
+    if n_clusters < 2:
+        return np.zeros(len(rfm), dtype=np.int8)
+
+    features = np.log1p(rfm[RFM_FEATURES].to_numpy(dtype=np.float64).clip(min=0))
+    spread = features.std(axis=0)
+    spread[spread == 0] = 1
+    features = (features - features.mean(axis=0)) / spread
+
+    model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=random_state)
+    labels = model.fit_predict(features)
+
+    # Rank the clusters: recent (low recency), frequent and high-spending centers first
+    centers = model.cluster_centers_
+    quality = centers[:, 1] + centers[:, 2] - centers[:, 0]
+    rank = np.empty(n_clusters, dtype=np.int8)
+    rank[np.argsort(-quality, kind='stable')] = np.arange(n_clusters)
+    return rank[labels]
+
+def segment_names(n_segments):
+    """Display names of the segments, best first"""
+    if n_segments == len(SEGMENT_NAMES):
+        return list(SEGMENT_NAMES)
+    return [f"Segment {number}" for number in range(1, n_segments + 1)]
+
+def customer_segments(customers, n_segments=DEFAULT_SEGMENTS, as_of=None, random_state=0):
+    """RFM features, scores and segment of every customer, with a summary per segment.
+
+    Features, scores and summary are vectorized passes over the customer
+    table and each k-means step touches one batch of customers, so the
+    cost grows linearly with the number of customers. Returns
+    {'customers': DataFrame, 'summary': DataFrame}.
+    """
+    rfm = rfm_table(customers, as_of)
+    labels = segment_customers(rfm, n_segments, random_state=random_state)
+    table = pd.concat([rfm, rfm_scores(rfm)], axis=1)
+    table['segment'] = pd.Categorical.from_codes(labels, categories=segment_names(n_segments))
+
+    grouped = table.groupby('segment', observed=True)
+    summary = pd.DataFrame({
+        'Customers': grouped.size(),
+        'Share of Customers (%)': grouped.size() / max(len(table), 1) * 100,
+        'Avg Recency (days)': grouped['recency_days'].mean(),
+        'Avg Orders': grouped['frequency'].mean(),
+        'Avg Spend (₹)': grouped['monetary'].mean(),
+        'Total Revenue (₹)': grouped['monetary'].sum()
+    }).round(2)
+    return {'customers': table, 'summary': summary}
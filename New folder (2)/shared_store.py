@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from data_cache import source_matches
+
+logger = logging.getLogger(__name__)
+
+# Bump when the column file layout changes so old stores are republished
+STORE_VERSION = 1
+# Published versions kept on disk, the current one included
+KEEP_VERSIONS = 2
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+
+def store_root(data_path):
+    """Directory holding the published versions of a source file's cleaned orders"""
+    return f"{data_path}.store"
+
+def current_version(data_path):
+    """Name of the version CURRENT points to, or None before anything is published"""
+    try:
+        with open(os.path.join(store_root(data_path), CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _write_columns(directory, df):
+    columns = []
+    for position, (name, column) in enumerate(df.items()):
+        entry = {'name': name, 'file': f"{position}.npy"}
+        # Text columns are stored as categorical codes with the categories in the metadata
+        if isinstance(column.dtype, pd.CategoricalDtype) or column.dtype == object:
+            column = column.astype('category')
+            entry['categories'] = column.cat.categories.tolist()
+            array = column.cat.codes.to_numpy()
+        else:
+            array = column.to_numpy()
+        np.save(os.path.join(directory, entry['file']), array, allow_pickle=False)
+        columns.append(entry)
+    return columns
+
+def publish_frame(data_path, df, source, **metadata):
+    """Write df as one memory-mappable file per column and make it the current version.
+
+    The version is named after the source's content hash. It is written
+    under a temporary name and renamed into place, then CURRENT is replaced
+    atomically, so readers attach either the previous or the new version
+    and never a partial one. Returns the version name.
+    """
+    root = store_root(data_path)
+    version = f"v{STORE_VERSION}-{source['hash']}"
+    target = os.path.join(root, version)
+    os.makedirs(root, exist_ok=True)
+
+    if not os.path.exists(os.path.join(target, META_FILE)):
+        staging = os.path.join(root, f"tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            meta = {
+                'version': STORE_VERSION,
+                'source': source,
+                'rows': len(df),
+                'columns': _write_columns(staging, df),
+                **metadata
+            }
+            with open(os.path.join(staging, META_FILE), 'w') as f:
+                json.dump(meta, f)
+            os.rename(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            # Another process published the same version first
+            if not os.path.exists(os.path.join(target, META_FILE)):
+                raise
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    pointer = os.path.join(root, CURRENT_FILE)
+    with open(f"{pointer}.{uuid.uuid4().hex}.tmp", 'w') as f:
+        f.write(version)
+    os.replace(f.name, pointer)
+    _remove_old_versions(root, version)
+    return version
+
+def _remove_old_versions(root, current):
+    versions = [name for name in os.listdir(root) if name.startswith('v') and name != current]
+    versions.sort(key=lambda name: os.path.getmtime(os.path.join(root, name)), reverse=True)
+    # Processes still attached to a removed version keep their mappings on POSIX;
+    # where mapped files cannot be deleted (Windows) the removal is retried next time
+    for name in versions[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+def attach_frame(data_path):
+    """Return (df, meta) mapped from the current version, or None if it is missing or stale.
+
+    Every column is a read-only memory map of the published files, so all
+    processes attached to a version share one copy through the page cache.
+    """
+    root = store_root(data_path)
+    version = current_version(data_path)
+    if version is None:
+        return None
+    directory = os.path.join(root, version)
+    try:
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != STORE_VERSION or not source_matches(data_path, meta['source']):
+        return None
+
+    columns = {}
+    for entry in meta['columns']:
+        # An empty array cannot be memory-mapped
+        array = np.load(os.path.join(directory, entry['file']), mmap_mode='r' if meta['rows'] else None)
+        if 'categories' in entry:
+            array = pd.Categorical.from_codes(array, dtype=pd.CategoricalDtype(entry['categories']))
+        columns[entry['name']] = array
+    meta['store_version'] = version
+    return pd.DataFrame(columns, copy=False), meta
@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+
+def hash_values(values):
+    """64-bit hashes that agree for equal values across chunks and categoricals"""
+    return pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+
+class HyperLogLog:
+    """Mergeable approximate distinct counter.
+
+    Uses 2**precision one-byte registers; the relative standard error of
+    the estimate is about 1.04 / sqrt(2**precision).
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        """Add a batch of values to the sketch"""
+        self.update_hashes(hash_values(values))
+
+    def update_hashes(self, hashes):
+        """Add a batch of values already hashed with hash_values"""
+        if len(hashes) == 0:
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        # The low bits are set so the rank stays bounded when the rest is zero
+        rest = (hashes << p) | ((np.uint64(1) << p) - np.uint64(1))
+        rank = (64 - np.floor(np.log2(rest.astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """Combine with a sketch built over other values"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        merged = HyperLogLog(self.precision)
+        merged.registers = np.maximum(self.registers, other.registers)
+        return merged
+
+    @property
+    def relative_error(self):
+        """Relative standard error of the estimate"""
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def estimate(self):
+        """Approximate number of distinct values added so far"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # Linear counting is more accurate while many registers are still empty
+        if raw <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)
+        return float(raw)
+
+def dkw_bound(samples, confidence=0.95):
+    """Largest rank error of quantiles read from a uniform sample (Dvoretzky-Kiefer-Wolfowitz)"""
+    if samples == 0:
+        return float('nan')
+    return float(np.sqrt(np.log(2 / (1 - confidence)) / (2 * samples)))
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang and Liberty).
+
+    Values are kept in compactors of growing weight; a full compactor is
+    sorted and every other value is promoted to the next level. Memory is
+    O(k log(n / k)) values. Count, mean and standard deviation are exact.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.compactors = [np.empty(0)]
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        height = len(self.compactors)
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (height - level - 1))))
+
+    def update(self, values):
+        """Add a batch of values to the sketch; missing values are ignored"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.total_squares += float(np.square(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                items = np.sort(items)
+                # With an odd count the largest value stays behind so no weight is lost
+                kept = items[len(items) - len(items) % 2:]
+                promoted = items[:len(items) - len(kept)][self._rng.integers(2)::2]
+                self.compactors[level] = kept
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+            level += 1
+
+    def merge(self, other):
+        """Combine with a sketch built over other values"""
+        if other.k != self.k:
+            raise ValueError("Cannot merge KLL sketches with different k")
+        merged = KLLSketch(self.k)
+        levels = max(len(self.compactors), len(other.compactors))
+        merged.compactors = [
+            np.concatenate([sketch.compactors[level] for sketch in (self, other) if level < len(sketch.compactors)])
+            for level in range(levels)
+        ]
+        merged.count = self.count + other.count
+        merged.total = self.total + other.total
+        merged.total_squares = self.total_squares + other.total_squares
+        merged.min = min(self.min, other.min)
+        merged.max = max(self.max, other.max)
+        merged._compress()
+        return merged
+
+    @property
+    def rank_error(self):
+        """Bound on the normalized rank error of a quantile (99% confidence); 0 while exact"""
+        if len(self.compactors) == 1:
+            return 0.0
+        # Empirical bound published for KLL sketches by Apache DataSketches
+        return 2.296 / self.k ** 0.9723
+
+    def quantiles(self, qs):
+        """Approximate values at the given quantiles (0 to 1)"""
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.compactors)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1], side='left')
+        values = items[np.clip(positions, 0, len(items) - 1)]
+        # The extremes are tracked exactly
+        values = np.where(np.asarray(qs) <= 0, self.min, values)
+        return np.where(np.asarray(qs) >= 1, self.max, values)
+
+    def describe(self):
+        """Summary in the layout of Series.describe(); the percentiles are approximate"""
+        count = self.count
+        mean = self.total / count if count else np.nan
+        variance = (self.total_squares - count * mean * mean) / (count - 1) if count > 1 else np.nan
+        q25, q50, q75 = self.quantiles([0.25, 0.5, 0.75])
+        return pd.Series({
+            'count': float(count),
+            'mean': mean,
+            'std': np.sqrt(max(variance, 0.0)) if count > 1 else np.nan,
+            'min': self.min if count else np.nan,
+            '25%': q25,
+            '50%': q50,
+            '75%': q75,
+            'max': self.max if count else np.nan
+        })
+
+class CountMinSketch:
+    """Mergeable frequency sketch.
+
+    Estimates never undercount; with probability 1 - exp(-depth) they
+    overcount by at most e / width of the total weight added.
+    """
+
+    def __init__(self, width=2048, depth=5):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        self.total = 0.0
+
+    def _columns(self, hashes):
+        # Double hashing derives every row's column from the two halves of one 64-bit hash
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low + rows * high) % np.uint64(self.width)).astype(np.intp)
+
+    def update(self, values, weights=None):
+        """Add values, each with a weight (default 1)"""
+        columns = self._columns(hash_values(values))
+        weights = np.ones(columns.shape[1]) if weights is None else np.asarray(weights, dtype=np.float64)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(columns[row], weights=weights, minlength=self.width)
+        self.total += float(weights.sum())
+
+    def estimate(self, values):
+        """Estimated total weight of each value"""
+        columns = self._columns(hash_values(values))
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def merge(self, other):
+        """Combine with a sketch of the same shape built over other values"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge Count-Min sketches of different shapes")
+        merged = CountMinSketch(self.width, self.depth)
+        merged.table = self.table + other.table
+        merged.total = self.total + other.total
+        return merged
+
+    @property
+    def error_bound(self):
+        """Largest overcount of any estimate, with probability 1 - exp(-depth)"""
+        return np.e / self.width * self.total
+
+class HeavyHitters:
+    """The k most frequent values of a column, counted with a Count-Min sketch.
+
+    Every batch's distinct values are counted into the sketch and compete
+    with the current candidates, so only k values are ever held.
+    """
+
+    def __init__(self, k=20, width=2048, depth=5):
+        self.k = k
+        self.counts = CountMinSketch(width, depth)
+        self.candidates = []
+
+    def update(self, values):
+        """Add a batch of values; missing values are ignored"""
+        batch = pd.Series(values).value_counts(dropna=True)
+        batch = batch[batch > 0]
+        if len(batch) == 0:
+            return
+        self.counts.update(batch.index.to_numpy(dtype=object), batch.to_numpy())
+        self._keep_top(list(batch.index))
+
+    def _keep_top(self, values):
+        pool = list(dict.fromkeys(self.candidates + values))
+        estimates = self.counts.estimate(np.array(pool, dtype=object))
+        order = np.argsort(-estimates, kind='stable')[:self.k]
+        self.candidates = [pool[position] for position in order]
+
+    def merge(self, other):
+        """Combine with heavy hitters tracked over other values"""
+        merged = HeavyHitters(self.k, self.counts.width, self.counts.depth)
+        merged.counts = self.counts.merge(other.counts)
+        merged._keep_top(self.candidates + other.candidates)
+        return merged
+
+    def top(self):
+        """Estimated counts of the most frequent values, largest first"""
+        if not self.candidates:
+            return pd.Series(dtype=np.float64)
+        estimates = self.counts.estimate(np.array(self.candidates, dtype=object))
+        return pd.Series(estimates, index=self.candidates).sort_values(ascending=False, kind='stable')
+
+    @property
+    def error_bound(self):
+        return self.counts.error_bound
+
+class HashSample:
+    """Rows of a coordinated sample of keys, chosen by the hash of the key.
+
+    A key is in the sample when the top `level` bits of its hash are zero,
+    so every row of a sampled key is kept wherever it appears, and samples
+    built over different partitions merge into a sample of the union. The
+    level goes up (halving the sampled keys) whenever more than max_rows
+    rows are held. Only `columns` (default all) of the rows are kept.
+    """
+
+    def __init__(self, max_rows=100_000, columns=None):
+        self.max_rows = max_rows
+        self.columns = columns
+        self.level = 0
+        self.rows = None
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    @property
+    def fraction(self):
+        """Share of all keys that are in the sample"""
+        return 2.0 ** -self.level
+
+    def _selected(self, hashes, level):
+        if level == 0:
+            return np.ones(len(hashes), dtype=bool)
+        return (hashes >> np.uint64(64 - level)) == 0
+
+    def update(self, rows, hashes):
+        """Add rows whose keys hash to `hashes`"""
+        keep = self._selected(hashes, self.level)
+        held = self._selected(self.hashes, self.level)
+        # The level is raised on the hashes alone, so an oversized batch is never copied whole
+        while np.count_nonzero(keep) + np.count_nonzero(held) > self.max_rows and self.level < 64:
+            self.level += 1
+            keep = self._selected(hashes, self.level)
+            held = self._selected(self.hashes, self.level)
+
+        rows, hashes = rows[keep], hashes[keep]
+        if self.columns is not None:
+            rows = rows[[column for column in self.columns if column in rows.columns]]
+        if self.rows is not None and not held.all():
+            self.rows = self.rows[held].reset_index(drop=True)
+            self.hashes = self.hashes[held]
+        self.rows = rows if self.rows is None else pd.concat([self.rows, rows], ignore_index=True)
+        self.hashes = np.concatenate([self.hashes, hashes])
+
+    def merge(self, other):
+        """Combine with a sample of other rows taken with the same hash"""
+        merged = HashSample(self.max_rows, self.columns)
+        merged.level = max(self.level, other.level)
+        for sample in (self, other):
+            if sample.rows is not None:
+                merged.update(sample.rows, sample.hashes)
+        return merged
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import sqlite3
+
+import pandas as pd
+
+import data_cache
+from aggregation import OrderAggregates, CUBE_DIMENSIONS, PREFERENCE_COLUMNS, TIME_CUBE_DIMENSIONS
+from ecommerce_analysis import EcommerceAnalyzer
+from instrumentation import instrumented
+from order_data import TIME_CODE_DTYPES, as_time_codes
+
+logger = logging.getLogger(__name__)
+
+SEGMENTATION_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'customer_segmentation.sql')
+# Names for the result of each SELECT in customer_segmentation.sql, in file order
+SEGMENTATION_QUERIES = ['high_value_customers', 'segment_summary']
+INDEXED_COLUMNS = ['customer_id', 'order_date', 'city']
+# Time codes as computed by order_data.time_codes: months since 1970-01 and days
+# from Monday (strftime('%w') numbers the days from Sunday)
+MONTH_SQL = ("(CAST(substr(order_date, 1, 4) AS INTEGER) - 1970) * 12 "
+             "+ CAST(substr(order_date, 6, 2) AS INTEGER) - 1")
+DAY_OF_WEEK_SQL = "(CAST(strftime('%w', order_date) AS INTEGER) + 6) % 7"
+LOAD_CHUNK_ROWS = 100_000
+
+# SQL expressions for the cube measures kept by OrderAggregates
+CUBE_MEASURES = {
+    'rows': 'COUNT(*)',
+    'orders': 'COUNT(order_id)',
+    'transactions': 'COUNT(total_price)',
+    'revenue': 'SUM(total_price)',
+    'units': 'SUM(quantity)'
+}
+
+def read_statements(path):
+    """Split a SQL script into statements, dropping comment lines"""
+    with open(path) as f:
+        lines = [line for line in f if not line.strip().startswith('--')]
+    return [statement.strip() for statement in ''.join(lines).split(';') if statement.strip()]
+
+class SQLAnalyzer(EcommerceAnalyzer):
+    """EcommerceAnalyzer whose aggregation runs inside an embedded SQLite database.
+
+    The CSV is loaded once into an indexed `orders` table (rebuilt only when
+    the CSV changes). The shared aggregates are computed with GROUP BY
+    queries, so the analyze_* methods never hold the raw orders in pandas,
+    and customer_segmentation.sql can be run against the same table.
+    """
+
+    def __init__(self, data_path, database=None):
+        self.database = database or f"{data_path}.sqlite"
+        self.connection = None
+        super().__init__(data_path, use_cache=False)
+
+    @instrumented
+    def load_data(self):
+        """Load the CSV into the orders table unless the database is already current"""
+        self._aggregates = None
+        try:
+            self.connection = sqlite3.connect(self.database)
+            fingerprint = data_cache.source_fingerprint(self.data_path)
+            if self._loaded_source() == fingerprint:
+                logger.info("Using order table in %s", self.database)
+                return
+            rows = self._load_orders()
+            self.connection.execute("CREATE TABLE source (fingerprint TEXT)")
+            self.connection.execute("INSERT INTO source VALUES (?)", (json.dumps(fingerprint),))
+            self.connection.commit()
+            logger.info("Data loaded successfully into %s! %s rows", self.database, f"{rows:,}")
+        except Exception as e:
+            logger.error("Error loading data: %s", e)
+
+    @instrumented
+    def clean_data(self):
+        """Month keys are derived from order_date inside the queries"""
+        self.is_clean = True
+
+    def _loaded_source(self):
+        try:
+            row = self.connection.execute("SELECT fingerprint FROM source").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _load_orders(self):
+        connection = self.connection
+        connection.execute("DROP VIEW IF EXISTS customer_segments")
+        connection.execute("DROP TABLE IF EXISTS orders")
+        connection.execute("DROP TABLE IF EXISTS source")
+        rows = 0
+        for chunk in pd.read_csv(self.data_path, chunksize=LOAD_CHUNK_ROWS):
+            chunk.to_sql('orders', connection, if_exists='append', index=False)
+            rows += len(chunk)
+        columns = pd.read_sql("SELECT * FROM orders LIMIT 0", connection).columns
+        for column in INDEXED_COLUMNS:
+            if column in columns:
+                connection.execute(f"CREATE INDEX idx_orders_{column} ON orders ({column})")
+        return rows
+
+    def query(self, sql, params=()):
+        """Run a query against the order database and return a DataFrame"""
+        return pd.read_sql(sql, self.connection, params=params)
+
+    def run_segmentation(self):
+        """Execute customer_segmentation.sql and return its query results by name"""
+        statements = read_statements(SEGMENTATION_SQL)
+        self.connection.execute("DROP VIEW IF EXISTS customer_segments")
+        results = {}
+        queries = iter(SEGMENTATION_QUERIES)
+        for statement in statements:
+            if statement.upper().startswith('SELECT'):
+                results[next(queries)] = self.query(statement)
+            else:
+                self.connection.execute(statement)
+        return results
+
+    @instrumented
+    def compute_aggregates(self):
+        """Push the cube, customer and preference groupings down into SQL"""
+        if self._aggregates is not None or self.connection is None:
+            return self._aggregates
+
+        columns = set(self.query("SELECT * FROM orders LIMIT 0").columns)
+        cube = self._cube(CUBE_DIMENSIONS, columns)
+        time_cube = self._cube(TIME_CUBE_DIMENSIONS, columns)
+
+        customers = self.query(
+            "SELECT customer_id, COUNT(*) AS purchases, COUNT(total_price) AS transactions, "
+            "SUM(total_price) AS revenue, MAX(order_date) AS last_order FROM orders "
+            "WHERE customer_id IS NOT NULL GROUP BY customer_id"
+        ).set_index('customer_id')
+        customers['last_order'] = pd.to_datetime(customers['last_order'])
+        preferences = {}
+        for column in PREFERENCE_COLUMNS:
+            if column not in columns:
+                continue
+            preferences[column] = self.query(
+                f"SELECT customer_id, {column}, COUNT(*) AS count, MIN(order_date) AS first_order FROM orders "
+                f"WHERE customer_id IS NOT NULL AND {column} IS NOT NULL "
+                f"GROUP BY customer_id, {column}"
+            ).set_index(['customer_id', column])
+            preferences[column]['first_order'] = pd.to_datetime(preferences[column]['first_order'])
+        self._aggregates = OrderAggregates(cube, customers, preferences, time_cube=time_cube)
+        return self._aggregates
+
+    def _cube(self, dimensions, columns):
+        """GROUP BY the dimensions, time codes computed in SQL, with every cube measure"""
+        keys = {
+            'month': MONTH_SQL,
+            'day_of_week': DAY_OF_WEEK_SQL,
+            'hour': "CAST(strftime('%H', order_date) AS INTEGER)"
+        }
+        dimensions = [col for col in dimensions if col in columns or col in keys]
+        measures = {name: expr for name, expr in CUBE_MEASURES.items()
+                    if name != 'units' or 'quantity' in columns}
+        select = ', '.join([f"{keys.get(col, col)} AS {col}" for col in dimensions] +
+                           [f"{expr} AS {name}" for name, expr in measures.items()])
+        cube = self.query(f"SELECT {select} FROM orders GROUP BY {', '.join(dimensions)}")
+        for column in TIME_CODE_DTYPES:
+            if column in cube.columns:
+                cube[column] = as_time_codes(cube[column], column)
+        return cube
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    analyzer = SQLAnalyzer('data/ecommerce_data.csv')
+    segments = analyzer.run_segmentation()
+
+    print("\nCustomer Segments:")
+    print(segments['segment_summary'].to_string(index=False))
+
+    print("\nTop High-Value Customers:")
+    print(segments['high_value_customers'].head().to_string(index=False))
@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from order_data import ID_FORMATS, downcast_numeric, encode_prefixed_ids
+
+logger = logging.getLogger(__name__)
+
+# Bump when the file layout changes so old stores are rejected rather than misread
+STORAGE_VERSION = 1
+# Order stores are directories with this suffix, e.g. data/ecommerce_data.orders
+STORE_SUFFIX = '.orders'
+MANIFEST_FILE = '_manifest.json'
+# Partition of the orders without a date; no date range ever selects it
+UNDATED_PARTITION = 'unknown'
+# Rows per Parquet row group; order_date statistics let a date range skip whole groups
+ROW_GROUP_ROWS = 100_000
+
+# Columns every read includes: the order key, the partition column and the revenue
+BASE_COLUMNS = ['order_id', 'order_date', 'total_price']
+# Further columns read for each analysis (OrderQuery.METRICS names)
+METRIC_COLUMNS = {
+    'overview': ['customer_id'],
+    'top_products': ['product_name', 'quantity'],
+    'revenue_trends': [],
+    'regional_performance': ['city'],
+    'payment_methods': ['payment_method'],
+    'peak_periods': [],
+    'customer_behavior': ['customer_id', 'city', 'payment_method'],
+    'customer_segments': ['customer_id']
+}
+
+def is_order_store(path):
+    """Whether path names a partitioned order store rather than a single file"""
+    return str(path).rstrip('/\\').endswith(STORE_SUFFIX)
+
+def columns_for(metrics):
+    """Columns needed to answer the given analyses, or None for every column"""
+    if metrics is None:
+        return None
+    unknown = set(metrics) - set(METRIC_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+    columns = list(BASE_COLUMNS)
+    for metric in metrics:
+        columns += [column for column in METRIC_COLUMNS[metric] if column not in columns]
+    return columns
+
+def read_manifest(path):
+    """The store's manifest, listing its partitions, or None if path is not a readable store"""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == STORAGE_VERSION else None
+
+def _partition_key(month_code):
+    return str(np.datetime64(int(month_code), 'M')) if month_code >= 0 else UNDATED_PARTITION
+
+def _to_table(df, encoded_ids):
+    """Arrow table of a chunk with IDs as integers and every text column dictionary-encoded"""
+    columns = {}
+    for name, column in df.items():
+        if name in encoded_ids:
+            prefix, width = encoded_ids[name]
+            codes = encode_prefixed_ids(column, prefix, width)
+            if codes is None:
+                raise ValueError(f"{name} values no longer match {prefix}{'0' * width}; "
+                                 "IDs must use one format throughout a store")
+            columns[name] = pa.array(codes.to_numpy(dtype=np.int64))
+        elif isinstance(column.dtype, pd.CategoricalDtype) or column.dtype == object:
+            array = pa.array(column.astype(object), type=pa.string(), from_pandas=True)
+            columns[name] = array.dictionary_encode().cast(pa.dictionary(pa.int32(), pa.string()))
+        elif pd.api.types.is_datetime64_any_dtype(column):
+            columns[name] = pa.array(column.to_numpy(dtype='datetime64[ns]'), from_pandas=True)
+        else:
+            columns[name] = pa.array(column.to_numpy(), from_pandas=True)
+    return pa.table(columns)
+
+def write_order_store(chunks, path):
+    """Write DataFrame chunks of orders as a month-partitioned Parquet store and return the row count.
+
+    Each month gets one file under <version>/month=YYYY-MM/, and an
+    order_date read as text is parsed first. Prefixed IDs (see
+    order_data.ID_FORMATS) are stored as integers when the first
+    chunk's IDs all match the format. The new version is written beside
+    the current one and the manifest is replaced atomically, so readers
+    see either the old or the new store in full.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to write an order store")
+    os.makedirs(path, exist_ok=True)
+    version = uuid.uuid4().hex
+    writers = {}
+    partitions = {}
+    encoded_ids = None
+    schema = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            if 'order_date' not in chunk.columns:
+                raise ValueError("order store chunks need an order_date column to partition by")
+            if not pd.api.types.is_datetime64_any_dtype(chunk['order_date']):
+                # Stored as text, the dates would be read back as strings the analyses cannot use
+                chunk = chunk.assign(order_date=pd.to_datetime(chunk['order_date']))
+            if encoded_ids is None:
+                encoded_ids = {
+                    column: fmt for column, fmt in ID_FORMATS.items()
+                    if column in chunk.columns and encode_prefixed_ids(chunk[column], *fmt) is not None
+                }
+            table = _to_table(chunk, encoded_ids)
+            schema = schema or table.schema
+            table = table.cast(schema)
+
+            months = chunk['order_date'].to_numpy().astype('datetime64[M]')
+            codes = np.where(np.isnat(months), -1, months.astype(np.int64))
+            for code in np.unique(codes):
+                key = _partition_key(code)
+                if key not in writers:
+                    relative = os.path.join(version, f"month={key}", 'part-0.parquet')
+                    os.makedirs(os.path.dirname(os.path.join(path, relative)))
+                    writers[key] = pq.ParquetWriter(os.path.join(path, relative), schema)
+                    partitions[key] = {'file': relative, 'rows': 0}
+                part = table.filter(pa.array(codes == code))
+                writers[key].write_table(part, row_group_size=ROW_GROUP_ROWS)
+                partitions[key]['rows'] += len(part)
+            rows += len(chunk)
+    except Exception:
+        for writer in writers.values():
+            writer.close()
+        shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+        raise
+    for writer in writers.values():
+        writer.close()
+    for partition in partitions.values():
+        partition['bytes'] = os.path.getsize(os.path.join(path, partition['file']))
+
+    manifest = {
+        'version': STORAGE_VERSION,
+        'data_version': version,
+        'rows': rows,
+        'columns': schema.names if schema is not None else [],
+        'encoded_ids': encoded_ids or {},
+        'partitions': dict(sorted(partitions.items()))
+    }
+    pointer = os.path.join(path, MANIFEST_FILE)
+    with open(f"{pointer}.{version}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f.name, pointer)
+
+    # Readers of an older version keep their open files on POSIX
+    for name in os.listdir(path):
+        if name != version and os.path.isdir(os.path.join(path, name)):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return rows
+
+def select_partitions(manifest, start=None, end=None):
+    """Partitions whose month overlaps [start, end], end being a whole day"""
+    if start is None and end is None:
+        return dict(manifest['partitions'])
+    first = pd.Timestamp(start).to_period('M') if start is not None else None
+    last = pd.Timestamp(end).to_period('M') if end is not None else None
+    selected = {}
+    for key, partition in manifest['partitions'].items():
+        if key == UNDATED_PARTITION:
+            continue
+        month = pd.Period(key, freq='M')
+        if (first is None or month >= first) and (last is None or month <= last):
+            selected[key] = partition
+    return selected
+
+def read_order_store(path, start=None, end=None, columns=None):
+    """Read the orders placed from start through end (whole days) and return (df, encoded_ids).
+
+    Only the partitions of the months in range are opened and only the
+    requested columns are decoded. Within the first and last month,
+    row groups outside the range are skipped by their order_date statistics.
+    Dictionary-encoded columns are returned as categoricals.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to read an order store")
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No order store at {path}")
+    if columns is not None:
+        columns = [column for column in manifest['columns'] if column in columns]
+
+    selected = select_partitions(manifest, start, end)
+    files = [os.path.join(path, partition['file']) for partition in selected.values()]
+    logger.info("Reading %d of %d month partitions (%.2f of %.2f MB)", len(selected),
+                len(manifest['partitions']),
+                sum(partition['bytes'] for partition in selected.values()) / 1024 ** 2,
+                sum(partition['bytes'] for partition in manifest['partitions'].values()) / 1024 ** 2)
+
+    if not files:
+        any_file = next(iter(manifest['partitions'].values()), None)
+        if any_file is None:
+            return pd.DataFrame(columns=columns or manifest['columns']), {}
+        table = pq.read_schema(os.path.join(path, any_file['file'])).empty_table()
+        table = table.select(columns) if columns is not None else table
+    else:
+        condition = None
+        if start is not None:
+            condition = ds.field('order_date') >= pa.scalar(pd.Timestamp(start).normalize(), pa.timestamp('ns'))
+        if end is not None:
+            before = ds.field('order_date') < pa.scalar(
+                pd.Timestamp(end).normalize() + pd.Timedelta(days=1), pa.timestamp('ns'))
+            condition = before if condition is None else condition & before
+        table = ds.dataset(files, format='parquet').to_table(columns=columns, filter=condition)
+
+    df = table.to_pandas()
+    for column in df.columns:
+        # Sorted like the categories read_csv infers, so results do not depend on the storage format
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.set_categories(df[column].cat.categories.sort_values())
+    encoded_ids = {column: tuple(fmt) for column, fmt in manifest['encoded_ids'].items() if column in df.columns}
+    for column in encoded_ids:
+        # IDs are written as int64; most fit the analyzer's usual int32 codes
+        if df[column].to_numpy().max(initial=0) <= np.iinfo(np.int32).max:
+            df[column] = df[column].astype(np.int32)
+    downcast_numeric(df)
+    return df, encoded_ids
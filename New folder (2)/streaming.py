@@ -0,0 +1,108 @@
+import logging
+
+import pandas as pd
+
+from aggregation import OrderAggregates, OrderSketches, align_customer_keys
+from ecommerce_analysis import EcommerceAnalyzer
+from instrumentation import instrumented
+from order_data import read_orders, compact_columns, parse_order_date, memory_usage_mb
+
+logger = logging.getLogger(__name__)
+
+# Rows read up front to estimate how much memory one order row takes
+SAMPLE_ROWS = 10_000
+MIN_CHUNK_ROWS = 1_000
+# A chunk's groupbys need a few times the memory of the chunk itself
+CHUNK_OVERHEAD = 4
+
+def _state_memory_mb(aggregates):
+    """Approximate memory held by the merged aggregates"""
+    frames = [aggregates.cube]
+    if aggregates.time_cube is not None:
+        frames.append(aggregates.time_cube)
+    if aggregates.customers is not None:
+        frames.append(aggregates.customers)
+    frames.extend(aggregates.preferences.values())
+    return sum(frame.memory_usage(deep=True).sum() if isinstance(frame, pd.DataFrame)
+               else frame.memory_usage(deep=True) for frame in frames) / 1024 ** 2
+
+class StreamingAnalyzer(EcommerceAnalyzer):
+    """EcommerceAnalyzer for order files larger than memory.
+
+    The file is never loaded whole: it is read in chunks sized to fit
+    max_memory_mb, and each chunk is folded into mergeable OrderAggregates
+    (sums, counts, per-customer tallies and OrderSketches of the orders).
+    All analyze_* methods and generate_report work from those aggregates.
+    If the per-customer tables outgrow their half of the memory budget they
+    are dropped and customer figures fall back to the sketches, as they do
+    from the start with track_customers=False.
+    """
+
+    def __init__(self, data_path, max_memory_mb=256, chunk_rows=None, track_customers=True):
+        self.max_memory_mb = max_memory_mb
+        self.chunk_rows = chunk_rows
+        self.track_customers = track_customers
+        super().__init__(data_path, use_cache=False)
+
+    @instrumented
+    def load_data(self):
+        """Size the read chunks; the orders themselves are read when analyzed"""
+        self.df = None
+        self._aggregates = None
+        try:
+            if self.chunk_rows is None:
+                self.chunk_rows = self._chunk_rows_for_budget()
+            logger.info("Streaming %s in chunks of %s rows", self.data_path, f"{self.chunk_rows:,}")
+        except Exception as e:
+            logger.error("Error loading data: %s", e)
+
+    @instrumented
+    def clean_data(self):
+        """Time columns are derived chunk by chunk while streaming"""
+        self.is_clean = True
+
+    def _chunk_rows_for_budget(self):
+        sample = read_orders(self.data_path, nrows=SAMPLE_ROWS)
+        compact_columns(sample)
+        bytes_per_row = memory_usage_mb(sample) * 1024 ** 2 / max(len(sample), 1)
+        # Half of the budget is for the chunk being folded, half for the aggregates
+        budget = self.max_memory_mb * 1024 ** 2 / 2
+        return max(MIN_CHUNK_ROWS, int(budget / (bytes_per_row * CHUNK_OVERHEAD)))
+
+    @instrumented
+    def compute_aggregates(self):
+        """Fold the order file chunk by chunk into one set of aggregates"""
+        if self._aggregates is not None or self.chunk_rows is None:
+            return self._aggregates
+
+        state = None
+        rows = 0
+        self.encoded_ids = {}
+        sketches = OrderSketches()
+        chunks = read_orders(self.data_path, dtype={'customer_id': 'category'}, chunksize=self.chunk_rows)
+        for chunk in chunks:
+            # Sketched before compaction so customer hashes agree across chunks
+            sketches.update(chunk)
+            encoded = compact_columns(chunk)
+            parse_order_date(chunk)
+            part = OrderAggregates.from_frame(chunk, customers=self.track_customers)
+
+            if state is None:
+                self.encoded_ids = encoded
+            elif self.track_customers:
+                # Customer keys stay integer codes until a chunk cannot be encoded
+                state, part, self.encoded_ids = align_customer_keys(state, self.encoded_ids, part, encoded)
+            state = part if state is None else state.merge(part)
+            rows += len(chunk)
+
+            if self.track_customers and _state_memory_mb(state) > self.max_memory_mb / 2:
+                logger.warning("Per-customer aggregates exceed the memory limit; "
+                               "falling back to approximate customer figures")
+                self.track_customers = False
+                state = state.drop_customers()
+
+        if state is not None:
+            state.sketches = sketches
+        self._aggregates = state
+        logger.info("Streamed %s rows", f"{rows:,}")
+        return self._aggregates
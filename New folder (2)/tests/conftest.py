@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live at the project root rather than in a package
+sys.path.insert(0, PROJECT_DIR)
+
+BUNDLED_CSV = os.path.join(PROJECT_DIR, 'data', 'ecommerce_data.csv')
+
+@pytest.fixture(scope='session')
+def bundled_csv():
+    return BUNDLED_CSV
+
+@pytest.fixture
+def orders():
+    """The bundled orders read with plain pandas, the reference for every check"""
+    df = pd.read_csv(BUNDLED_CSV)
+    df['order_date'] = pd.to_datetime(df['order_date'])
+    return df
\ No newline at end of file
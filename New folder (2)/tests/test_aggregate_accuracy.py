@@ -0,0 +1,159 @@
+"""Sketch merging, incremental folding and partition pruning against exact pandas results.
+
+Run from the project directory:
+    python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+from aggregation import OrderSketches
+from incremental import IncrementalAggregator
+from order_data import decode_prefixed_ids
+
+def product_table(df):
+    """analyze_top_products computed with a plain groupby"""
+    products = df.groupby('product_name').agg(
+        revenue=('total_price', 'sum'), units=('quantity', 'sum'), orders=('order_id', 'count'))
+    return products.round(2).sort_index()
+
+def split(df, parts):
+    return [df.iloc[rows] for rows in np.array_split(np.arange(len(df)), parts)]
+
+class TestSketchMerge:
+    def test_merged_sketches_equal_whole_sketches(self, orders):
+        whole = OrderSketches.from_frame(orders)
+        parts = [OrderSketches.from_frame(part) for part in split(orders, 3)]
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+
+        # HyperLogLog registers and Count-Min tables are exact unions
+        np.testing.assert_array_equal(merged.customers.registers, whole.customers.registers)
+        for column, hitters in whole.heavy_hitters.items():
+            np.testing.assert_array_equal(merged.heavy_hitters[column].counts.table, hitters.counts.table)
+
+    def test_merged_customer_figures_match_pandas(self, orders):
+        parts = [OrderSketches.from_frame(part) for part in split(orders, 3)]
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+        purchases = orders.groupby('customer_id').size()
+
+        # The bundled customers fit the sample, so these are exact
+        assert merged.exact_customers
+        assert merged.distinct_customers() == orders['customer_id'].nunique()
+        assert merged.repeat_customers() == int((purchases > 1).sum())
+
+    def test_merged_distinct_estimate_within_error(self, orders):
+        # A sample too small for every customer falls back to the HyperLogLog estimate
+        parts = [OrderSketches.from_frame(part, sample_rows=100) for part in split(orders, 3)]
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+        exact = orders['customer_id'].nunique()
+
+        assert not merged.exact_customers
+        assert abs(merged.distinct_customers() - exact) <= 3 * merged.customers.relative_error * exact
+
+    def test_merged_heavy_hitters_within_error(self, orders):
+        parts = [OrderSketches.from_frame(part) for part in split(orders, 3)]
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+
+        for column in ('product_name', 'city'):
+            exact = orders[column].value_counts()
+            top = merged.top(column)
+            # Count-Min never undercounts and overcounts by at most its error bound
+            assert set(top.index) == set(exact.index)
+            assert (top >= exact[top.index]).all()
+            assert (top - exact[top.index] <= merged.heavy_hitters[column].error_bound).all()
+
+    def test_merged_quantiles_within_rank_error(self, orders):
+        parts = [OrderSketches.from_frame(part, k=50) for part in split(orders, 3)]
+        merged = parts[0].merge(parts[1]).merge(parts[2]).order_values
+        values = np.sort(orders['total_price'].to_numpy())
+        qs = np.array([0.1, 0.25, 0.5, 0.75, 0.9])
+
+        assert merged.count == len(values)
+        assert merged.min == values[0] and merged.max == values[-1]
+        error = merged.rank_error + 1 / len(values)
+        for q, value in zip(qs, merged.quantiles(qs)):
+            below = np.searchsorted(values, value, side='left') / len(values)
+            at_most = np.searchsorted(values, value, side='right') / len(values)
+            assert below - error <= q <= at_most + error
+
+class TestIncrementalFold:
+    def test_refresh_folds_only_appended_bytes(self, bundled_csv, orders, tmp_path):
+        with open(bundled_csv, 'rb') as f:
+            header, *lines = f.read().splitlines(keepends=True)
+        path = str(tmp_path / 'orders.csv')
+        with open(path, 'wb') as f:
+            f.write(header + b''.join(lines[:600]))
+        first = IncrementalAggregator(path)
+        first.refresh()
+        assert first.bytes_read == len(b''.join(lines[:600]))
+
+        # A partly written last line is left for the next refresh
+        appended, last = b''.join(lines[600:-1]), lines[-1]
+        with open(path, 'ab') as f:
+            f.write(appended + last[:10])
+        second = IncrementalAggregator(path)
+        second.refresh()
+        assert second.bytes_read == len(appended)
+        assert second.state['rows'] == len(lines) - 1
+
+        with open(path, 'ab') as f:
+            f.write(last[10:])
+        third = IncrementalAggregator(path)
+        aggregates = third.refresh()
+        assert third.bytes_read == len(last)
+        assert third.state['rows'] == len(orders)
+
+        top = aggregates.top_products()
+        top = top.set_axis(top.index.astype(str)).sort_index()
+        expected = product_table(orders)
+        np.testing.assert_allclose(top['Total Revenue (₹)'], expected['revenue'])
+        np.testing.assert_array_equal(top['Units Sold'], expected['units'])
+        np.testing.assert_array_equal(top['Number of Orders'], expected['orders'])
+
+        monthly = orders.groupby(orders['order_date'].dt.to_period('M'))['total_price'].sum()
+        np.testing.assert_allclose(aggregates.monthly_revenue().to_numpy(), monthly.to_numpy())
+
+        overview = aggregates.overview()
+        purchases = orders.groupby('customer_id').size()
+        assert overview['total_orders'] == len(orders)
+        assert overview['total_revenue'] == pytest.approx(orders['total_price'].sum())
+        assert overview['total_customers'] == len(purchases)
+        assert overview['repeat_customers'] == int((purchases > 1).sum())
+
+class TestPartitionPruning:
+    START, END = '2023-03-15', '2023-05-10'
+
+    @pytest.fixture
+    def store_path(self, orders, tmp_path):
+        pytest.importorskip('pyarrow')
+        path = str(tmp_path / 'orders.orders')
+        storage.write_order_store(split(orders, 2), path)
+        return path
+
+    def test_only_overlapping_months_are_selected(self, store_path, orders):
+        manifest = storage.read_manifest(store_path)
+        months = orders['order_date'].dt.to_period('M').astype(str).unique()
+
+        assert sorted(manifest['partitions']) == sorted(months)
+        assert sorted(storage.select_partitions(manifest, self.START, self.END)) == [
+            '2023-03', '2023-04', '2023-05']
+
+    def test_range_read_matches_pandas_filter(self, store_path, orders):
+        df, encoded_ids = storage.read_order_store(store_path, self.START, self.END)
+        if 'order_id' in encoded_ids:
+            df['order_id'] = decode_prefixed_ids(df['order_id'], *encoded_ids['order_id'])
+
+        dates = orders['order_date']
+        expected = orders[(dates >= self.START) & (dates < pd.Timestamp(self.END) + pd.Timedelta(days=1))]
+        assert sorted(df['order_id']) == sorted(expected['order_id'])
+        assert df['total_price'].sum() == pytest.approx(expected['total_price'].sum())
+
+    def test_range_read_decodes_only_requested_columns(self, store_path, orders):
+        df, _ = storage.read_order_store(store_path, self.START, self.END, columns=['order_id', 'city'])
+
+        assert list(df.columns) == ['order_id', 'city']
+        mask = orders['order_date'].between(self.START, self.END)
+        pd.testing.assert_series_equal(
+            df['city'].astype(str).value_counts().sort_index(),
+            orders.loc[mask, 'city'].value_counts().sort_index())
\ No newline at end of file
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# Bucket sizes offered for revenue trends: label -> pandas period frequency
+GRANULARITIES = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'M', 'Quarterly': 'Q'}
+# Growth comparisons: the previous bucket (MoM for months) or the same dates a year earlier (YoY)
+COMPARISONS = ('previous', 'year')
+
+class RevenueSeries:
+    """Order revenue over time as prefix sums over the orders sorted by date.
+
+    The revenue of any date range is two binary searches into the sorted
+    dates and one subtraction of prefix sums, so a range total costs
+    O(log n) and a bucketed view O(k log n) for k buckets, however many
+    orders fall inside. Orders without a date are left out.
+    """
+
+    def __init__(self, dates, revenue):
+        """dates must be sorted datetime64 values without NaT, revenue aligned with them"""
+        self.dates = np.asarray(dates, dtype='datetime64[ns]').view(np.int64)
+        revenue = np.nan_to_num(np.asarray(revenue, dtype=np.float64))
+        self.prefix = np.concatenate(([0.0], np.cumsum(revenue)))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from order rows in any order"""
+        dates = df['order_date'].to_numpy(dtype='datetime64[ns]')
+        order = np.argsort(dates, kind='stable')
+        order = order[~np.isnat(dates[order])]
+        return cls(dates[order], df['total_price'].to_numpy(dtype=np.float64, na_value=np.nan)[order])
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def date_range(self):
+        """First and last order date, or (None, None) when empty"""
+        if not len(self):
+            return None, None
+        return pd.Timestamp(self.dates[0]), pd.Timestamp(self.dates[-1])
+
+    def _positions(self, bounds):
+        return np.searchsorted(self.dates, bounds, side='left')
+
+    def totals(self, starts, ends):
+        """Revenue of the orders in each [start, end) interval, vectorized over the bounds"""
+        starts = pd.DatetimeIndex(starts).as_unit('ns').asi8
+        ends = pd.DatetimeIndex(ends).as_unit('ns').asi8
+        return self.prefix[self._positions(ends)] - self.prefix[self._positions(starts)]
+
+    def counts(self, starts, ends):
+        """Number of order rows in each [start, end) interval"""
+        starts = pd.DatetimeIndex(starts).as_unit('ns').asi8
+        ends = pd.DatetimeIndex(ends).as_unit('ns').asi8
+        return self._positions(ends) - self._positions(starts)
+
+    def total(self, start=None, end=None):
+        """Revenue of the orders placed from start up to, but excluding, end"""
+        low = 0 if start is None else self._positions(pd.Timestamp(start).as_unit('ns').value)
+        high = len(self) if end is None else self._positions(pd.Timestamp(end).as_unit('ns').value)
+        return float(self.prefix[max(high, low)] - self.prefix[low])
+
+    def periods(self, freq='M'):
+        """Every period of the given frequency from the first to the last order"""
+        first, last = self.date_range
+        if first is None:
+            return pd.PeriodIndex([], freq=freq, name='period')
+        return pd.period_range(first.to_period(freq), last.to_period(freq), freq=freq, name='period')
+
+    def _bucket_totals(self, periods, offset=None):
+        starts, ends = periods.start_time, (periods + 1).start_time
+        if offset is not None:
+            starts, ends = starts - offset, ends - offset
+        return self.totals(starts, ends)
+
+    def resample(self, freq='M'):
+        """Revenue per period (D, W, M, Q, Y), including periods without orders"""
+        periods = self.periods(freq)
+        return pd.Series(self._bucket_totals(periods), index=periods, name='total_price')
+
+    def rolling(self, freq='D', window=7, mean=False):
+        """Revenue of the trailing window of periods ending at each period (or its mean per period)"""
+        periods = self.periods(freq)
+        totals = self.totals((periods - (window - 1)).start_time, (periods + 1).start_time)
+        if mean:
+            # Windows cut off by the start of the data average over the periods they cover
+            covered = np.minimum(np.arange(1, len(periods) + 1), window)
+            totals = totals / covered
+        return pd.Series(totals, index=periods, name='total_price')
+
+    def growth(self, freq='M', compare='previous'):
+        """Percent change of each period's revenue against the previous period or the same dates a year earlier.
+
+        Periods whose comparison lies before the first order are NaN, as
+        with pct_change.
+        """
+        if compare not in COMPARISONS:
+            raise ValueError(f"Unknown comparison: {compare}")
+        periods = self.periods(freq)
+        current = self._bucket_totals(periods)
+        if compare == 'previous':
+            previous = self._bucket_totals(periods - 1)
+            known = np.arange(len(periods)) > 0
+        else:
+            offset = pd.DateOffset(years=1)
+            previous = self._bucket_totals(periods, offset)
+            known = (periods.start_time - offset) >= periods.start_time.min()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = (current / previous - 1) * 100
+        return pd.Series(np.where(known, change, np.nan), index=periods, name='total_price')